@@ -1,12 +1,16 @@
 import os
 
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse
 from django.views import View
 
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from movies import metrics
+from movies.apps.movies.services import CachedOMDBAPI
+from movies.cache import result_caches
+
 
 class HealthCheckView(APIView):
     def get(self, request, *args, **kwargs):
@@ -19,6 +23,29 @@ class HealthCheckView(APIView):
         )
 
 
+class MetricsView(View):
+    def get(self, request, *args, **kwargs):
+        cache_stats = CachedOMDBAPI.get_stats()
+        lines = metrics.render_histograms() + metrics.render_counter(
+            'movies_omdb_cache_lookups_total',
+            'Lookups of OMDb API responses cache of this process.',
+            {(('result', result),): cache_stats.get(result, 0) for result in ['hits', 'error_hits', 'misses']},
+        )
+        lines += metrics.render_counter(
+            'movies_result_cache_lookups_total',
+            'Lookups of query results cache of this process, by tier which had the result.',
+            {
+                (('cache', cache.name), ('result', result)): cache.get_stats().get(result, 0)
+                for cache in result_caches for result in ['local_hits', 'shared_hits', 'misses']
+            },
+        ) + metrics.render_gauge(
+            'movies_result_cache_hit_ratio',
+            'Share of lookups of query results cache of this process found in either tier.',
+            {(('cache', cache.name),): cache.get_hit_ratio() for cache in result_caches},
+        )
+        return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class HomeView(View):
     def get(self, request, *args, **kwargs):
         return HttpResponseRedirect(reverse('movies:movies'))
@@ -1,32 +1,197 @@
+import json
+
+from django.conf import settings
+from django.db import router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from movies.apps.movies import services, models
-from movies.utils import paginate_iterable, parse_date
+from movies.cache import facets_results, movies_results
+from movies.parsers import NDJSONParser
+from movies.utils import paginate_by_cursor, paginate_iterable, parse_date
+
+
+def conditional_on_write_version(get_key):
+    """
+    Answers GET requests with 304 Not Modified without calling the view,
+    if write version of listed data didn't change since client's ETag or Last-Modified.
+    ETag includes format of the negotiated renderer, JSON and MessagePack bodies of the same version differ.
+    :param get_key: function returning write version key of data listed for given request,
+        None if the request isn't answered conditionally.
+    """
+    def get_version(request):
+        if not hasattr(request, 'write_version'):
+            key = get_key(request)
+            if key is None:
+                request.write_version = None, None, None
+            else:
+                version, modified_on = models.WriteVersion.objects.get_version(key)
+                etag = f'W/"{key}:{version}:{request.accepted_renderer.format}"'
+                request.write_version = etag, modified_on, version
+        return request.write_version
+
+    return method_decorator([vary_on_headers('Accept'), condition(
+        etag_func=lambda request, *args, **kwargs: get_version(request)[0],
+        last_modified_func=lambda request, *args, **kwargs: get_version(request)[1],
+    )])
+
+
+def get_comments_write_version_key(request):
+    movie_id = request.GET.get('movie')
+    if movie_id:
+        # key of the movie the comments are filtered by, such as 3 for "03", it's bumped with that id
+        try:
+            return models.Comment.get_movie_write_version_key(int(movie_id))
+        except ValueError:
+            return None
+    return models.Comment.WRITE_VERSION_KEY
+
+
+def get_movie_id(request):
+    """
+    :return: (int or None, None or string)  # Tuple of movie id comments are filtered by, None if not given, and error.
+    """
+    movie_id = request.GET.get('movie')
+    if not movie_id:
+        return None, None
+    try:
+        return int(movie_id), None
+    except ValueError:
+        return None, 'This field needs to be a number.'
+
+
+def get_page_size(request):
+    """
+    :return: (int, None or string)  # Tuple of page size asked for with page_size, at most MAX_PAGE_SIZE, and error.
+    """
+    page_size = request.GET.get('page_size')
+    if not page_size:
+        return settings.PAGE_SIZE, None
+    if not page_size.isdigit() or int(page_size) < 1:
+        return settings.PAGE_SIZE, f'This field needs to be a number between 1 and {settings.MAX_PAGE_SIZE}.'
+    return min(int(page_size), settings.MAX_PAGE_SIZE), None
+
+
+def get_movie_filters(request):
+    """
+    :return: (dict, dict)  # Tuple of search, year, year_from and year_to query parameters and errors of invalid ones,
+        search is lowercase as it's case insensitive, year_from and year_to are integers.
+    """
+    filters = {
+        'search': request.GET.get('search', '').lower() or None,
+        'year': request.GET.get('year') or None,
+        'year_from': request.GET.get('year_from') or None,
+        'year_to': request.GET.get('year_to') or None,
+    }
+    errors = {}
+    for name in ['year_from', 'year_to']:
+        if filters[name] is not None:
+            if filters[name].isdigit():
+                filters[name] = int(filters[name])
+            else:
+                errors[name] = 'This field needs to be a year.'
+    return filters, errors
+
+
+def filter_movies(queryset, filters):
+    """
+    :param filters: dict returned by get_movie_filters.
+    """
+    if filters['search']:
+        queryset = queryset.search(filters['search'])
+    if filters['year']:
+        queryset = queryset.filter_by_year(filters['year'])
+    if filters['year_from'] is not None or filters['year_to'] is not None:
+        queryset = queryset.filter_by_year_range(filters['year_from'], filters['year_to'])
+    return queryset
+
+
+def is_database_json_accepted(request):
+    return settings.DATABASE_JSON_RENDERING and isinstance(request.accepted_renderer, JSONRenderer)
+
+
+def database_json_response(rows, **data):
+    """
+    Builds the same response as JSONRenderer would for {'results': rows, **data},
+    from rows already rendered to JSON by the database.
+    """
+    content = '{"results":[' + ','.join(rows) + ']'
+    for key, value in data.items():
+        content += ',' + json.dumps(key) + ':' + json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    content += '}'
+    # same as JSONRenderer, escape characters which are valid in JSON, but not in javascript
+    content = content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+    return HttpResponse(content.encode(), content_type='application/json')
 
 
 class MoviesView(APIView):
+    @conditional_on_write_version(lambda request: models.Movie.WRITE_VERSION_KEY)
     def get(self, request, *args, **kwargs):
-        queryset = models.Movie.objects.all()
+        page_size, page_size_error = get_page_size(request)
+        if page_size_error:
+            return Response(
+                data={'errors': {'page_size': page_size_error}},
+                status=400
+            )
+
+        filters, errors = get_movie_filters(request)
+        if errors:
+            return Response(
+                data={'errors': errors},
+                status=400
+            )
+        queryset = filter_movies(models.Movie.objects.all(), filters)
 
+        # search orders by relevance, explicit order takes precedence
         order = self.request.GET.get('order')
         if order:
             queryset = queryset.order_by_external_field(order)
 
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.search(search)
+        fields = [field.strip() for field in self.request.GET.get('fields', '').split(',') if field.strip()]
+        if fields:
+            queryset = queryset.select_external_fields(list(dict.fromkeys(fields)))
 
-        year = self.request.GET.get('year')
-        if year:
-            queryset = queryset.filter_by_year(year)
+        if 'cursor' in self.request.GET:
+            if is_database_json_accepted(request):
+                rows, next_cursor = paginate_by_cursor(
+                    queryset.with_json(), self.request.GET['cursor'], ['json'], page_size
+                )
+                return database_json_response([row['json'] for row in rows], next=next_cursor)
+
+            queryset, next_cursor = paginate_by_cursor(queryset, self.request.GET['cursor'], page_size=page_size)
+            return Response(
+                data={
+                    'results': [m.serialize() for m in queryset],
+                    'next': next_cursor,
+                },
+                status=200
+            )
 
         page = self.request.GET.get('page', 1)
-        queryset = paginate_iterable(queryset, page)
+        # the same listings are requested over and over, pages are cached until movies change
+        key = (
+            *filters.values(), order, int(page) if str(page).isdigit() else page, page_size, tuple(fields),
+            is_database_json_accepted(request),
+        )
+        version = request.write_version[2]
+        if is_database_json_accepted(request):
+            return database_json_response(movies_results.get_or_compute(key, version, lambda: list(
+                paginate_iterable(queryset.with_json().values_list('json', flat=True), page, page_size)
+            )))
 
         return Response(
             data={
-                'results': [m.serialize() for m in queryset]
+                'results': movies_results.get_or_compute(
+                    key, version, lambda: [m.serialize() for m in paginate_iterable(queryset, page, page_size)]
+                )
             },
             status=200
         )
@@ -39,7 +204,12 @@ class MoviesView(APIView):
                 status=400
             )
         movie_data, error = services.get_or_create_movie_by_title(movie_title)
-        if error:
+        if isinstance(error, services.OMDBAPIUnavailable):
+            return Response(
+                data={'error': str(error)},
+                status=503
+            )
+        elif error:
             return Response(
                 data={'error': error},
                 status=404
@@ -51,16 +221,160 @@ class MoviesView(APIView):
             )
 
 
+class MoviesFacetsView(APIView):
+    @conditional_on_write_version(lambda request: models.Movie.WRITE_VERSION_KEY)
+    def get(self, request, *args, **kwargs):
+        filters, errors = get_movie_filters(request)
+        facets = [facet.strip() for facet in request.GET.get('facets', '').split(',') if facet.strip()]
+        facets = list(dict.fromkeys(facets)) or settings.FACET_FIELDS
+        unknown = [facet for facet in facets if facet not in settings.FACET_FIELDS]
+        if unknown:
+            errors['facets'] = f"Unknown facets {', '.join(unknown)}, available are {', '.join(settings.FACET_FIELDS)}."
+        if errors:
+            return Response(
+                data={'errors': errors},
+                status=400
+            )
+
+        # counting values goes through all matching movies, counts are cached until movies change
+        total, results = facets_results.get_or_compute(
+            (*filters.values(), tuple(facets)),
+            request.write_version[2],
+            lambda: filter_movies(models.Movie.objects.all(), filters).facets(facets, settings.FACET_LIMIT)
+        )
+        return Response(
+            data={
+                'total': total,
+                'results': results,
+            },
+            status=200
+        )
+
+
+class MoviesSuggestView(APIView):
+    def get(self, request, *args, **kwargs):
+        prefix = request.GET.get('q', '')
+        if not prefix.strip():
+            return Response(
+                data={'q': 'This field is required.'},
+                status=400
+            )
+        try:
+            limit = min(int(request.GET.get('limit', settings.SUGGEST_LIMIT)), settings.SUGGEST_MAX_LIMIT)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response(
+                data={'limit': f'This field needs to be a number between 1 and {settings.SUGGEST_MAX_LIMIT}.'},
+                status=400
+            )
+
+        return Response(
+            data={
+                'results': models.Movie.objects.all().suggest(prefix, limit)
+            },
+            status=200
+        )
+
+
+class MoviesBatchView(APIView):
+    def post(self, request, *args, **kwargs):
+        titles = request.data.get('titles')
+        if hasattr(request.data, 'getlist'):
+            titles = request.data.getlist('titles')
+
+        if not titles or not isinstance(titles, list) or not all(isinstance(t, str) and t for t in titles):
+            return Response(
+                data={'titles': 'This field is required and must be a list of titles.'},
+                status=400
+            )
+        if len(titles) > settings.BATCH_IMPORT_MAX_TITLES:
+            return Response(
+                data={'titles': f'At most {settings.BATCH_IMPORT_MAX_TITLES} titles can be imported at once.'},
+                status=400
+            )
+
+        results = []
+        for title, (movie_data, error) in zip(titles, services.get_or_create_movies_by_titles(titles)):
+            if error:
+                results.append({'title': title, 'error': str(error)})
+            else:
+                results.append({'title': title, 'movie': movie_data})
+
+        return Response(
+            data={
+                'results': results
+            },
+            status=200
+        )
+
+
+class MoviesExportView(APIView):
+    def get(self, request, *args, **kwargs):
+        since = request.GET.get('since')
+        if since:
+            since, since_error = parse_date(since)
+            if since_error:
+                return Response(
+                    data={'errors': {'since': "This field needs to be a valid ISO 8601 date in UTC."}},
+                    status=400
+                )
+
+        # streamed after ReplicaMiddleware returns, read database of the request is picked now
+        return StreamingHttpResponse(
+            services.export_movies(
+                search=request.GET.get('search'),
+                year=request.GET.get('year'),
+                updated_since=since,
+                using=router.db_for_read(models.Movie),
+            ),
+            content_type='application/x-ndjson'
+        )
+
+
 class CommentsView(APIView):
+    @conditional_on_write_version(get_comments_write_version_key)
     def get(self, request, *args, **kwargs):
-        queryset = models.Comment.objects.all()
+        errors = {}
+        page_size, page_size_error = get_page_size(request)
+        if page_size_error:
+            errors['page_size'] = page_size_error
+        movie_id, movie_id_error = get_movie_id(request)
+        if movie_id_error:
+            errors['movie'] = movie_id_error
+        if errors:
+            return Response(
+                data={'errors': errors},
+                status=400
+            )
 
-        movie_id = request.GET.get('movie')
+        queryset = models.Comment.objects.all()
         if movie_id:
             queryset = queryset.filter_by_movie_id(movie_id)
 
+        if 'cursor' in self.request.GET:
+            if is_database_json_accepted(request):
+                rows, next_cursor = paginate_by_cursor(
+                    queryset.with_json(), self.request.GET['cursor'], ['json'], page_size
+                )
+                return database_json_response([row['json'] for row in rows], next=next_cursor)
+
+            queryset, next_cursor = paginate_by_cursor(queryset, self.request.GET['cursor'], page_size=page_size)
+            return Response(
+                data={
+                    'results': [c.serialize() for c in queryset],
+                    'next': next_cursor,
+                },
+                status=200
+            )
+
         page = self.request.GET.get('page', 1)
-        queryset = paginate_iterable(queryset, page)
+        if is_database_json_accepted(request):
+            return database_json_response(
+                paginate_iterable(queryset.with_json().values_list('json', flat=True), page, page_size)
+            )
+
+        queryset = paginate_iterable(queryset, page, page_size)
 
         return Response(
             data={
@@ -87,7 +401,62 @@ class CommentsView(APIView):
             )
 
 
+class CommentsBulkView(APIView):
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                data={'errors': {'non_field_errors': 'Body needs to be a JSON array or NDJSON.'}},
+                status=400
+            )
+        if len(rows) > settings.BULK_COMMENTS_MAX_ROWS:
+            error = f'At most {settings.BULK_COMMENTS_MAX_ROWS} comments can be added at once.'
+            return Response(data={'errors': {'non_field_errors': error}}, status=400)
+
+        created, errors = services.add_comments_to_movies(rows)
+
+        return Response(
+            data={
+                'created': created,
+                'errors': errors,
+            },
+            status=200
+        )
+
+
+class CommentsExportView(APIView):
+    def get(self, request, *args, **kwargs):
+        since = request.GET.get('since')
+        if since:
+            since, since_error = parse_date(since)
+            if since_error:
+                return Response(
+                    data={'errors': {'since': "This field needs to be a valid ISO 8601 date in UTC."}},
+                    status=400
+                )
+
+        # errors can't be reported once the response started streaming
+        movie_id, movie_id_error = get_movie_id(request)
+        if movie_id_error:
+            return Response(
+                data={'errors': {'movie': movie_id_error}},
+                status=400
+            )
+
+        return StreamingHttpResponse(
+            services.export_comments(
+                movie_id=movie_id,
+                added_since=since,
+                using=router.db_for_read(models.Comment),
+            ),
+            content_type='application/x-ndjson'
+        )
+
+
 class TopView(APIView):
+    @conditional_on_write_version(lambda request: models.Comment.WRITE_VERSION_KEY)
     def get(self, request, *args, **kwargs):
         queryset = models.Movie.objects.all()
 
@@ -106,6 +475,9 @@ class TopView(APIView):
                 errors['to'] = "This field needs to be a valid ISO 8601 date in UTC."
         else:
             errors['to'] = "This query parameter is required."
+        page_size, page_size_error = get_page_size(request)
+        if page_size_error:
+            errors['page_size'] = page_size_error
 
         if errors:
             return Response(
@@ -115,7 +487,11 @@ class TopView(APIView):
         queryset = queryset.ranked(from_date, to_date)
 
         page = self.request.GET.get('page', 1)
-        queryset = paginate_iterable(queryset, page)
+        if is_database_json_accepted(request):
+            rows = queryset.with_ranked_json().values_list('json', flat=True)
+            return database_json_response(paginate_iterable(rows, page, page_size))
+
+        queryset = paginate_iterable(queryset, page, page_size)
 
         return Response(
             data={
@@ -123,3 +499,25 @@ class TopView(APIView):
             },
             status=200
         )
+
+
+class TrendingView(APIView):
+    # not conditional on comments write version, scores decay between comment inserts
+    def get(self, request, *args, **kwargs):
+        page_size, page_size_error = get_page_size(request)
+        if page_size_error:
+            return Response(
+                data={'errors': {'page_size': page_size_error}},
+                status=400
+            )
+
+        queryset = models.Movie.objects.all().trending().only('trending_score')
+        queryset = paginate_iterable(queryset, request.GET.get('page', 1), page_size)
+        now = timezone.now()
+
+        return Response(
+            data={
+                'results': [m.serialize_trending(now) for m in queryset]
+            },
+            status=200
+        )
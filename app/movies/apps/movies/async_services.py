@@ -0,0 +1,129 @@
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+import aiohttp
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from movies import metrics
+from movies.apps.movies import models
+from movies.apps.movies.services import CachedOMDBAPI, OMDBAPI, OMDBAPIUnavailable
+from movies.middleware import ServerTimingMiddleware
+from movies.utils import normalize_title
+
+# database queries of coroutines run here, so they don't block the event loop
+database_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DATABASE_THREADS, thread_name_prefix='database')
+
+
+async def run_in_database_thread(function, *args):
+    def run():
+        # same as at the start and end of each request handled by django
+        close_old_connections()
+        try:
+            # queries count towards the request, like in ServerTimingMiddleware
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(ServerTimingMiddleware.time_query))
+                return function(*args)
+        finally:
+            close_old_connections()
+
+    return await asyncio.get_event_loop().run_in_executor(database_executor, metrics.bind_context(run))
+
+
+class AsyncOMDBAPI:
+    """
+    OMDBAPI for asyncio, requests of all coroutines of an event loop share one connection pool,
+    at most OMDB_API_ASYNC_CONCURRENCY connections are open at once.
+    """
+    _sessions = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get_session(cls):
+        loop = asyncio.get_event_loop()
+        session = cls._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=settings.OMDB_API_ASYNC_CONCURRENCY),
+                timeout=aiohttp.ClientTimeout(total=settings.OMDB_API_TIMEOUT),
+            )
+            cls._sessions[loop] = session
+        return session
+
+    @classmethod
+    async def close_session(cls):
+        session = cls._sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None:
+            await session.close()
+
+    async def get_movie(self, title):
+        """
+        Same as OMDBAPI.get_movie.
+        """
+        params = {'t': title}
+        if settings.OMDB_API_KEY is not None:
+            params['apikey'] = settings.OMDB_API_KEY
+        try:
+            with metrics.timed('omdb'):
+                async with self.get_session().get(OMDBAPI.url, params=params) as response:
+                    content = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return {}, OMDBAPIUnavailable(f'OMDb API request failed: {e!r}')
+
+        if not isinstance(content, dict):
+            return {}, OMDBAPIUnavailable('OMDb API request failed: unexpected response.')
+        if 'Error' in content:
+            return {}, content['Error']
+        else:
+            return content, None
+
+
+# fetches in progress in this process, concurrent requests for the same title wait for the first one
+_fetches = {}
+
+
+async def get_or_create_movie_by_title(title):
+    """
+    Same as services.get_or_create_movie_by_title, but OMDb API is requested without blocking a thread.
+    Concurrent requests for the same title are coalesced within the process, requests in other processes
+    can fetch it again, but the movie is created once as long as it has imdbID. Unlike the sync version, they don't
+    wait for the advisory lock of the title, it's held by a database connection, which would keep a database thread
+    busy for the whole OMDb API request.
+    """
+    key = normalize_title(title)
+    fetch = _fetches.get(key)
+    if fetch is None:
+        fetch = _fetches[key] = asyncio.ensure_future(_get_or_create_movie(key, title))
+        fetch.add_done_callback(lambda _: _fetches.pop(key, None))
+    return await asyncio.shield(fetch)
+
+
+def _get_movie_or_cached_response(key):
+    """
+    :return: (dict or None, tuple or None)  # Tuple of serialized movie and cached OMDb API response,
+        response is looked up only if movie doesn't exist.
+    """
+    movie = models.Movie.objects.filter(title_key=key).first()
+    if movie:
+        return movie.serialize(), None
+    return None, CachedOMDBAPI.get_cached([key]).get(key)
+
+
+async def _get_or_create_movie(key, title):
+    # one round trip to a database thread when the movie exists or its response is cached
+    movie_data, cached = await run_in_database_thread(_get_movie_or_cached_response, key)
+    if movie_data is not None:
+        return movie_data, None
+
+    if cached is not None:
+        movie_data, error = cached
+    else:
+        movie_data, error = await AsyncOMDBAPI().get_movie(title)
+        await run_in_database_thread(CachedOMDBAPI.store, {key: (movie_data, error)})
+
+    if error is not None:
+        return {}, error
+    movie = await run_in_database_thread(models.Movie.objects.get_or_create_with_external_data, movie_data)
+    return movie.serialize(), None
@@ -0,0 +1,142 @@
+"""
+ASGI views, served by movies.asgi next to the django application.
+They don't pass through django's MIDDLEWARE, so they do the same as movies.middleware themselves:
+time the request, route reads to the primary database and compress the response.
+"""
+import json
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.http.request import split_domain_port, validate_host
+
+from movies import metrics, routers
+from movies.apps.movies import async_services
+from movies.apps.movies.services import OMDBAPIUnavailable
+from movies.middleware import CompressionMiddleware, ServerTimingMiddleware, compress
+
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+def get_header(scope, name):
+    for key, value in scope['headers']:
+        if key.decode('latin-1').lower() == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def parse_title(scope, body):
+    """
+    :return: (bool, object)  # Tuple of whether the body is JSON or form which could be parsed and title from it.
+    """
+    content_type = get_header(scope, 'content-type').split(';')[0].strip()
+    try:
+        if content_type == 'application/json':
+            data = json.loads(body.decode())
+            return True, data.get('title') if isinstance(data, dict) else None
+        if content_type == 'application/x-www-form-urlencoded':
+            return True, parse_qs(body.decode()).get('title', [None])[-1]
+    except (UnicodeError, ValueError):
+        return False, None
+    return False, None
+
+
+def is_json_accepted(scope):
+    # other formats, such as MessagePack, are rendered by django, even if client accepts JSON as well
+    return 'msgpack' not in get_header(scope, 'accept')
+
+
+def is_host_allowed(scope):
+    """
+    Same check of Host header as HttpRequest.get_host(), django answers requests of other hosts with 400.
+    """
+    domain, _ = split_domain_port(get_header(scope, 'host'))
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = ['localhost', '127.0.0.1', '[::1]']
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+async def send_json(scope, send, data, status, headers=(), timings=None, start=None):
+    """
+    Sends JSON response, compressed like by CompressionMiddleware, with Server-Timing header of timings
+    collected since start.
+    """
+    serialize_start = time.perf_counter()
+    # same output as rest_framework's JSONRenderer
+    content = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    content = content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+    headers = [(b'content-type', b'application/json'), *headers]
+    if len(content) >= settings.COMPRESSION_MIN_SIZE:
+        headers.append((b'vary', b'Accept-Encoding'))
+        coding = CompressionMiddleware.get_coding(get_header(scope, 'accept-encoding'))
+        compressed = compress(coding, content) if coding else content
+        if len(compressed) < len(content):
+            content = compressed
+            headers.append((b'content-encoding', coding.encode()))
+    headers.append((b'content-length', str(len(content)).encode()))
+
+    if timings is not None:
+        timings.add('serialize', time.perf_counter() - serialize_start)
+        duration = time.perf_counter() - start
+        headers.append((b'server-timing', ServerTimingMiddleware.get_server_timing(timings, duration).encode()))
+        # same view name as django's for POST /movies
+        metrics.observe_request('movies:movies', scope['method'], duration, timings)
+
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': content})
+
+
+async def create_movie(scope, title, send):
+    """
+    Same as MoviesView.post, waiting for OMDb API doesn't block a worker.
+    :param title: title parsed from request body by parse_title.
+    """
+    timings, token = metrics.start_request()
+    start = time.perf_counter()
+    # reads of requests which write go to the primary database, like in ReplicaMiddleware
+    read_token = routers.use_read_database(routers.PRIMARY_DATABASE)
+    try:
+        data, status = await _create_movie(title)
+    finally:
+        routers.reset_read_database(read_token)
+        metrics.end_request(token)
+
+    headers = []
+    if settings.DATABASE_REPLICAS and status < 400:
+        headers.append((b'set-cookie', get_pin_cookie().encode()))
+    await send_json(scope, send, data, status, headers, timings, start)
+
+
+async def _create_movie(title):
+    """
+    :return: (dict, int)  # Tuple of response data and status.
+    """
+    if not title or not isinstance(title, str):
+        return {'title': 'This field is required.'}, 400
+
+    movie_data, error = await async_services.get_or_create_movie_by_title(title)
+    if isinstance(error, OMDBAPIUnavailable):
+        return {'error': str(error)}, 503
+    elif error:
+        return {'error': error}, 404
+    return movie_data, 200
+
+
+def get_pin_cookie():
+    # same as set by ReplicaMiddleware after writes
+    cookie = SimpleCookie()
+    cookie[routers.PIN_COOKIE_NAME] = '1'
+    cookie[routers.PIN_COOKIE_NAME].update({
+        'max-age': settings.REPLICA_PIN_SECONDS, 'path': '/', 'httponly': True, 'samesite': 'Lax'
+    })
+    return cookie[routers.PIN_COOKIE_NAME].OutputString()
@@ -0,0 +1,266 @@
+"""
+Synthetic data and benchmark scenarios, used by generate_synthetic_data and benchmark commands.
+"""
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytz
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from movies.apps.movies import api_views, models
+from movies.cache import result_caches
+from movies.middleware import compress
+from movies.renderers import MessagePackRenderer
+
+WORDS = [
+    'star', 'war', 'night', 'day', 'love', 'dark', 'city', 'king', 'last', 'lost', 'man', 'woman', 'house', 'river',
+    'blood', 'dream', 'fire', 'ice', 'shadow', 'light', 'game', 'story', 'road', 'sea', 'island', 'secret', 'time',
+    'empire', 'ghost', 'heart', 'hunter', 'kingdom', 'legend', 'moon', 'planet', 'queen', 'return', 'silence', 'storm',
+    'summer', 'winter', 'world', 'wild', 'zero', 'machine', 'mountain', 'garden', 'murder', 'paradise', 'revenge',
+]
+FIRST_NAMES = ['James', 'Mary', 'John', 'Anna', 'Robert', 'Linda', 'David', 'Sofia', 'Akira', 'Ingrid', 'Pedro', 'Mei']
+LAST_NAMES = ['Smith', 'Nowak', 'Kurosawa', 'Bergman', 'Almodovar', 'Lee', 'Garcia', 'Rossi', 'Kowalski', 'Dubois']
+GENRES = ['Action', 'Comedy', 'Drama', 'Horror', 'Sci-Fi', 'Romance', 'Thriller', 'Animation', 'Documentary']
+
+# comments are added until this moment, so generated data doesn't depend on current time
+COMMENTS_END = datetime(2019, 10, 14, tzinfo=pytz.UTC)
+
+
+def generate_external_data(rng, number):
+    """
+    :return: OMDb-like movie data, title is unique for each number.
+    """
+    year = rng.randint(1920, 2019)
+    is_series = rng.random() < 0.15
+    title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+    return {
+        'Title': f'{title} {number}',
+        'Year': f'{year}–' if is_series else str(year),
+        'Rated': rng.choice(['G', 'PG', 'PG-13', 'R', 'N/A']),
+        'Released': (datetime(year, 1, 1) + timedelta(days=rng.randint(0, 364))).strftime('%d %b %Y'),
+        'Runtime': f'{rng.randint(20, 200)} min',
+        'Genre': ', '.join(rng.sample(GENRES, rng.randint(1, 3))),
+        'Director': _generate_names(rng, 1),
+        'Writer': _generate_names(rng, rng.randint(1, 3)),
+        'Actors': _generate_names(rng, 4),
+        'Plot': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 40))).capitalize() + '.',
+        'Language': 'English',
+        'Country': 'USA',
+        'Awards': 'N/A',
+        'Poster': f'https://example.com/posters/{number}.jpg',
+        'Ratings': [{'Source': 'Internet Movie Database', 'Value': f'{rng.randint(10, 99) / 10}/10'}],
+        'imdbRating': f'{rng.randint(10, 99) / 10}',
+        'imdbVotes': f'{rng.randint(5, 2000000):,}',
+        'imdbID': f'tt{number:08d}',
+        'Type': 'series' if is_series else 'movie',
+        'Production': f'{rng.choice(LAST_NAMES)} Pictures',
+        'Response': 'True',
+    }
+
+
+def _generate_names(rng, count):
+    return ', '.join(f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(count))
+
+
+def generate_data(movies, comments, days=365, distribution='uniform', seed=0, batch_size=10000, log=None):
+    """
+    Creates synthetic movies and comments, the same arguments always generate the same data.
+    Comment counts of movies follow a power law, so a few movies have most of the comments.
+    :param days: comments are added within this many days before COMMENTS_END.
+    :param distribution: 'uniform' spreads comments evenly over days, 'recent' adds more of them in recent days.
+    """
+    rng = random.Random(seed)
+    first_number = models.Movie.objects.count()
+
+    movie_ids = []
+    for start in range(0, movies, batch_size):
+        batch = [
+            models.Movie(external_data=generate_external_data(rng, first_number + number))
+            for number in range(start, min(start + batch_size, movies))
+        ]
+        movie_ids.extend(movie.pk for movie in models.Movie.objects.bulk_create(batch))
+        if log:
+            log(f'Created {len(movie_ids)} movies.')
+
+    if not movie_ids:
+        return
+
+    weights = [1 / (rank + 1) for rank in range(len(movie_ids))]
+    rng.shuffle(weights)
+    cum_weights = _cumulate(weights)
+    seconds = days * 24 * 60 * 60
+    created = 0
+    while created < comments:
+        size = min(settings.BULK_COMMENTS_BATCH_SIZE, comments - created)
+        batch = []
+        for movie_id in rng.choices(movie_ids, cum_weights=cum_weights, k=size):
+            age = rng.random() if distribution == 'uniform' else rng.random() ** 3
+            batch.append(models.Comment(
+                movie_id=movie_id,
+                comment=' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 20))),
+                added_on=COMMENTS_END - timedelta(seconds=int(age * seconds)),
+            ))
+        if connection.vendor == 'postgresql':
+            models.Comment.objects.copy_from(batch)
+        else:
+            models.Comment.objects.bulk_create(batch)
+        created += size
+        if log:
+            log(f'Created {created} comments.')
+
+
+def _cumulate(weights):
+    total, cumulated = 0, []
+    for weight in weights:
+        total += weight
+        cumulated.append(total)
+    return cumulated
+
+
+def get_scenarios():
+    """
+    :return: dict of scenario name to function making a request and returning its response.
+    """
+    rf = RequestFactory()
+    movie_id = models.Movie.objects.order_by('pk').values_list('pk', flat=True).first()
+    top_range = {'from': (COMMENTS_END - timedelta(days=30)).isoformat(), 'to': COMMENTS_END.isoformat()}
+    bulk_comments = [{'movie': movie_id, 'comment': f'Benchmark {number}.'} for number in range(1000)]
+    titles = (f'Benchmark {number}' for number in range(10 ** 9))
+
+    def get(view, data=None):
+        return lambda: view.as_view()(rf.get('/', data=data or {}))
+
+    def post(view, data, content_type='application/json'):
+        return lambda: view.as_view()(rf.post('/', data=data() if callable(data) else data, content_type=content_type))
+
+    return {
+        'movies': get(api_views.MoviesView),
+        'movies_page_100': get(api_views.MoviesView, {'page': 100}),
+        'movies_cursor': get(api_views.MoviesView, {'cursor': ''}),
+        'movies_cached': get(api_views.MoviesView),
+        'movies_search': get(api_views.MoviesView, {'search': 'dark empire'}),
+        'movies_order_title': get(api_views.MoviesView, {'order': 'Title'}),
+        'movies_order_year': get(api_views.MoviesView, {'order': '-Year'}),
+        'movies_year': get(api_views.MoviesView, {'year': '1999'}),
+        'movies_year_range': get(api_views.MoviesView, {'year_from': '1990', 'year_to': '1999'}),
+        'movies_fields': get(api_views.MoviesView, {'fields': 'Title,Year'}),
+        'movies_suggest': get(api_views.MoviesSuggestView, {'q': 'st'}),
+        'movies_facets': get(api_views.MoviesFacetsView),
+        'movies_facets_search': get(api_views.MoviesFacetsView, {'search': 'dark empire'}),
+        'comments': get(api_views.CommentsView),
+        'comments_movie': get(api_views.CommentsView, {'movie': movie_id}),
+        'comments_cursor': get(api_views.CommentsView, {'cursor': ''}),
+        'top': get(api_views.TopView, top_range),
+        'trending': get(api_views.TrendingView),
+        'movies_create': post(api_views.MoviesView, lambda: {'title': next(titles)}),
+        'comments_create': post(api_views.CommentsView, {'movie': movie_id, 'comment': 'Benchmark.'}),
+        'comments_bulk': post(api_views.CommentsBulkView, bulk_comments),
+    }
+
+
+# scenarios measuring results cached by previous iterations, others measure computing them
+CACHED_SCENARIOS = {'movies_cached'}
+
+
+def fake_get_movie(self, title):
+    number = zlib.crc32(title.encode())
+    return generate_external_data(random.Random(number), number), None
+
+
+def run_benchmark(names=None, iterations=20, warmup=2):
+    """
+    Runs each scenario in a transaction which is rolled back, so data is the same for every run.
+    OMDb API is replaced by the synthetic data generator.
+    :return: dict of scenario name to its latency percentiles in milliseconds and number of SQL queries.
+    """
+    results = {}
+    # results cached by this process only, shared cache isn't touched
+    with mock.patch('movies.apps.movies.services.OMDBAPI.get_movie', fake_get_movie), \
+            override_settings(RESULT_CACHE_ALIAS=None):
+        for name, scenario in get_scenarios().items():
+            if names and name not in names:
+                continue
+
+            timings, queries = [], 0
+            for iteration in range(warmup + iterations):
+                if name not in CACHED_SCENARIOS:
+                    for cache in result_caches:
+                        cache.clear()
+                with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = scenario()
+                    if hasattr(response, 'render'):
+                        response.render()
+                    elapsed = time.perf_counter() - start
+                    transaction.set_rollback(True)
+
+                if response.status_code >= 400:
+                    raise ValueError(f'Scenario {name} failed with status {response.status_code}.')
+                if iteration >= warmup:
+                    timings.append(elapsed * 1000)
+                    queries = max(queries, len(captured))
+
+            results[name] = {
+                'p50': percentile(timings, 50),
+                'p90': percentile(timings, 90),
+                'p99': percentile(timings, 99),
+                'mean': sum(timings) / len(timings),
+                'queries': queries,
+            }
+    return results
+
+
+def run_encoding_benchmark(page_size=100, iterations=20):
+    """
+    Renders a page of the first page_size movies with each renderer and compresses it with each coding
+    the same way as CompressionMiddleware does.
+    :return: dict of '<format>+<coding>' to size in bytes and latency percentiles of encoding in milliseconds.
+    """
+    data = {'results': [m.serialize() for m in models.Movie.objects.order_by('pk')[:page_size]]}
+    results = {}
+    for renderer in [JSONRenderer(), MessagePackRenderer()]:
+        for coding in [None, 'gzip', 'br']:
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                content = renderer.render(data)
+                if coding is not None:
+                    content = compress(coding, content)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            results[f'{renderer.format}+{coding or "identity"}'] = {
+                'bytes': len(content),
+                'p50': percentile(timings, 50),
+                'p90': percentile(timings, 90),
+            }
+    return results
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    :param tolerance: allowed relative increase of p90 latency, such as 0.2 for 20%.
+    :return: list of regression descriptions, empty if there are none.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['p90'] > expected['p90'] * (1 + tolerance):
+            regressions.append(f"{name}: p90 {result['p90']:.2f} ms, baseline {expected['p90']:.2f} ms")
+        if result['queries'] > expected['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {expected['queries']}")
+    return regressions
@@ -0,0 +1,201 @@
+"""
+Load tests of movies.asgi and of production server, used by load_test_async and benchmark_server commands.
+"""
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from unittest import mock
+
+import aiohttp
+from aiohttp import web
+
+from movies.apps.movies import async_services, benchmark, models
+from movies.apps.movies.services import OMDBAPI
+from movies.warmup import asgi_request
+
+TITLE_PREFIX = 'load test '
+
+
+async def start_stub_omdb_api(delay, received):
+    """
+    Starts local server answering like OMDb API after delay seconds, with synthetic data of requested title.
+    :param received: list, requested titles are appended to it.
+    :return: (AppRunner, string)  # Tuple of runner to clean up and url of the server.
+    """
+    async def get_movie(request):
+        received.append(request.query.get('t', ''))
+        await asyncio.sleep(delay)
+        number = zlib.crc32(request.query.get('t', '').encode())
+        data = benchmark.generate_external_data(random.Random(number), number)
+        data['Title'] = request.query.get('t', '')
+        return web.json_response(data)
+
+    app = web.Application()
+    app.router.add_get('/', get_movie)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/'
+
+
+async def measure_reads(application, duration, readers, host):
+    """
+    :return: number of GET /movies requests completed per second by concurrent readers.
+    """
+    deadline = time.perf_counter() + duration
+    completed = 0
+
+    async def read():
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            status, _ = await asgi_request(application, 'GET', '/movies', host=host)
+            if status != 200:
+                raise ValueError(f'GET /movies failed with status {status}.')
+            completed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(read() for _ in range(readers)))
+    return completed / (time.perf_counter() - start)
+
+
+async def run_load_test(application, duration, readers, writers, upstream_delay, host='localhost'):
+    """
+    Measures read throughput alone and while writers wait for OMDb API stub to create movies,
+    the stub responds after upstream_delay seconds.
+    :return: dict of results.
+    """
+    received = []
+    runner, url = await start_stub_omdb_api(upstream_delay, received)
+    statuses = []
+
+    async def write(number):
+        data = {'title': f'{TITLE_PREFIX}{number}'}
+        status, _ = await asgi_request(application, 'POST', '/movies', data=data, host=host)
+        statuses.append(status)
+
+    try:
+        with mock.patch.object(OMDBAPI, 'url', url):
+            reads = await measure_reads(application, duration, readers, host)
+
+            writes = [asyncio.ensure_future(write(number)) for number in range(writers)]
+            # measure once all of them wait for the stub
+            deadline = time.perf_counter() + upstream_delay
+            while len(received) < writers and time.perf_counter() < deadline:
+                await asyncio.sleep(0.01)
+            reads_under_load = await measure_reads(application, duration, readers, host)
+            writes_in_flight = writers - len(statuses)
+            await asyncio.gather(*writes)
+    finally:
+        await async_services.AsyncOMDBAPI.close_session()
+        await runner.cleanup()
+
+    return {
+        'reads_per_second': reads,
+        'reads_per_second_under_load': reads_under_load,
+        'writes_in_flight': writes_in_flight,
+        'failed_writes': sum(1 for status in statuses if status != 200),
+    }
+
+
+def delete_created_movies():
+    models.Movie.objects.filter(title_key__startswith=TITLE_PREFIX).delete()
+    models.OMDBCacheEntry.objects.filter(key__startswith=TITLE_PREFIX).delete()
+
+
+# gunicorn command line arguments of compared server setups
+SERVER_SETUPS = {
+    'reload': ['movies.wsgi:application', '--reload'],
+    'config': ['-c', 'movies/gunicorn_config.py', 'movies.asgi:application'],
+}
+
+
+def benchmark_server(setup, paths, duration, concurrency, host='localhost', startup_timeout=60):
+    """
+    Starts gunicorn with given setup on a free local port and measures GET requests of paths sent by
+    concurrent clients, the server is stopped afterwards.
+    :param setup: name of SERVER_SETUPS.
+    :param paths: paths with query strings, requested in turns.
+    :return: dict of results.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    # gunicorn installed next to current python, such as in the same virtualenv
+    gunicorn = shutil.which('gunicorn', path=os.path.dirname(sys.executable)) or 'gunicorn'
+    with tempfile.TemporaryFile() as log:
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [gunicorn, *SERVER_SETUPS[setup], '--bind', f'127.0.0.1:{port}'],
+            cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+            stdout=subprocess.DEVNULL, stderr=log,
+        )
+        try:
+            return asyncio.run(_measure_server(
+                server, log, f'http://127.0.0.1:{port}', paths, duration, concurrency, host, start, startup_timeout
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+async def _measure_server(server, log, url, paths, duration, concurrency, host, start, startup_timeout):
+    async with aiohttp.ClientSession(headers={'Host': host}) as session:
+        # first request includes work done lazily by the server, such as connecting to the database
+        while True:
+            request_start = time.perf_counter()
+            try:
+                async with session.get(url + paths[0]) as response:
+                    await response.read()
+                    first_request = time.perf_counter() - request_start
+                    break
+            except aiohttp.ClientError:
+                if server.poll() is not None:
+                    log.seek(0)
+                    raise ValueError(f'Server exited:\n{log.read().decode()[-2000:]}')
+                if time.perf_counter() - start > startup_timeout:
+                    raise ValueError(f'Server did not respond within {startup_timeout} seconds.')
+                await asyncio.sleep(0.05)
+        first_response = time.perf_counter() - start
+
+        latencies, failures = [], 0
+        deadline = time.perf_counter() + duration
+
+        async def client(number):
+            nonlocal failures
+            requests = 0
+            while time.perf_counter() < deadline:
+                path = paths[(number + requests) % len(paths)]
+                requests += 1
+                request_start = time.perf_counter()
+                try:
+                    async with session.get(url + path) as response:
+                        await response.read()
+                        if response.status >= 400:
+                            failures += 1
+                            continue
+                except aiohttp.ClientError:
+                    failures += 1
+                    continue
+                latencies.append((time.perf_counter() - request_start) * 1000)
+
+        measure_start = time.perf_counter()
+        await asyncio.gather(*(client(number) for number in range(concurrency)))
+        elapsed = time.perf_counter() - measure_start
+
+    return {
+        'startup': first_response - first_request,
+        'first_request': first_request * 1000,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50': benchmark.percentile(latencies, 50) if latencies else None,
+        'p99': benchmark.percentile(latencies, 99) if latencies else None,
+        'failures': failures,
+    }
@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.apps.movies import benchmark, models
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures latency percentiles and SQL query counts of endpoints against current database, '
+        'see generate_synthetic_data. Changes made by scenarios are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', help='Run only this scenario, can be repeated.')
+        parser.add_argument('--iterations', type=int, default=20, help='Number of measured runs of each scenario.')
+        parser.add_argument('--warmup', type=int, default=2, help='Number of runs before measuring.')
+        parser.add_argument('--output', help='File to write JSON results to.')
+        parser.add_argument('--baseline', help='JSON results of previous run, fails on regression.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed relative increase of p90 latency over baseline, 0.2 by default.'
+        )
+
+    def handle(self, *args, **options):
+        if not models.Movie.objects.exists():
+            raise CommandError('There are no movies, create them with generate_synthetic_data first.')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations needs to be at least 1.')
+
+        results = benchmark.run_benchmark(options['scenario'], options['iterations'], options['warmup'])
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<20} p50 {result['p50']:9.2f} ms  p90 {result['p90']:9.2f} ms  "
+                f"p99 {result['p99']:9.2f} ms  {result['queries']} queries"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = benchmark.compare_to_baseline(results, json.load(baseline), options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
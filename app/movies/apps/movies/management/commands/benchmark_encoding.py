@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from movies.apps.movies import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares size and encoding time of a page of movies rendered as JSON and MessagePack, '
+        'uncompressed and compressed with gzip and brotli.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Number of movies on the page.')
+        parser.add_argument('--iterations', type=int, default=20, help='Measured encodings of each combination.')
+
+    def handle(self, *args, **options):
+        results = benchmark.run_encoding_benchmark(options['page_size'], options['iterations'])
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<18} {result['bytes']:8} bytes  p50 {result['p50']:8.3f} ms  p90 {result['p90']:8.3f} ms"
+            )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from movies.apps.movies import load_test
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares throughput of production server setups, gunicorn with default sync worker and --reload '
+        'and gunicorn with movies/gunicorn_config.py, by running each of them locally against current database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--setup', action='append', choices=list(load_test.SERVER_SETUPS),
+            help='Benchmark only this setup, can be repeated.'
+        )
+        parser.add_argument(
+            '--path', action='append',
+            help='Requested path with query string, can be repeated, /movies, /comments and /top by default.'
+        )
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of measurement of each setup.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Number of concurrent clients.')
+        parser.add_argument('--host', default='localhost', help='Host header of requests, must be allowed.')
+
+    def handle(self, *args, **options):
+        paths = options['path'] or ['/movies', '/comments', '/top?from=2019-01-01T00:00:00Z&to=2019-12-31T00:00:00Z']
+        for setup in options['setup'] or load_test.SERVER_SETUPS:
+            result = load_test.benchmark_server(
+                setup, paths, options['duration'], options['concurrency'], options['host']
+            )
+            self.stdout.write(
+                f"{setup:<8} {result['requests_per_second']:8.1f} requests/s  p50 {result['p50'] or 0:8.2f} ms  "
+                f"p99 {result['p99'] or 0:8.2f} ms  startup {result['startup']:.2f} s  "
+                f"first request {result['first_request']:.2f} ms  "
+                f"{result['failures']} failed"
+            )
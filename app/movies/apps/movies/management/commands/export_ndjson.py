@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.apps.movies import services
+from movies.utils import parse_date
+
+
+class Command(BaseCommand):
+    help = 'Exports movies or comments as NDJSON, one record per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=['movies', 'comments'])
+        parser.add_argument('--output', help='File to write to, standard output by default.')
+        parser.add_argument('--since', help='Only movies updated or comments added since this ISO 8601 date.')
+        parser.add_argument('--search', help='Only movies matching search.')
+        parser.add_argument('--year', help='Only movies from year.')
+        parser.add_argument('--movie', help='Only comments of movie with this id.')
+
+    def handle(self, *args, **options):
+        since = options['since']
+        if since:
+            since, since_error = parse_date(since)
+            if since_error:
+                raise CommandError(f'Invalid --since: {since_error}')
+        movie_id = options['movie']
+        if movie_id:
+            try:
+                movie_id = int(movie_id)
+            except ValueError:
+                raise CommandError(f'Invalid --movie: {movie_id} is not a number.')
+
+        if options['model'] == 'movies':
+            lines = services.export_movies(search=options['search'], year=options['year'], updated_since=since)
+        else:
+            lines = services.export_comments(movie_id=movie_id, added_since=since)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from movies.apps.movies import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Creates deterministic synthetic movies and comments for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10000, help='Number of movies to create.')
+        parser.add_argument('--comments', type=int, default=100000, help='Number of comments to create.')
+        parser.add_argument('--days', type=int, default=365, help='Comments are spread over this many days.')
+        parser.add_argument(
+            '--distribution', choices=['uniform', 'recent'], default='uniform',
+            help='Spread comments evenly over days or add more of them in recent days.'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Seed of random generator.')
+
+    def handle(self, *args, **options):
+        benchmark.generate_data(
+            movies=options['movies'],
+            comments=options['comments'],
+            days=options['days'],
+            distribution=options['distribution'],
+            seed=options['seed'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(f"Created {options['movies']} movies and {options['comments']} comments.")
@@ -0,0 +1,48 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.apps.movies import load_test
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures GET /movies throughput of movies.asgi alone and while movies are being created '
+        'through slow OMDb API stub. Created movies are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=2, help='Seconds of each measurement.')
+        parser.add_argument('--readers', type=int, default=10, help='Number of concurrent GET /movies requests.')
+        parser.add_argument('--writers', type=int, default=200, help='Number of POST /movies requests in flight.')
+        parser.add_argument(
+            '--upstream-delay', type=float, default=3,
+            help='Seconds OMDb API stub takes to respond, longer than duration keeps writes in flight during measurement '
+                 'and shorter than OMDB_API_TIMEOUT lets them succeed.'
+        )
+        parser.add_argument(
+            '--min-ratio', type=float, default=0.8,
+            help='Fails if throughput under load is lower than this fraction of throughput alone, 0.8 by default.'
+        )
+        parser.add_argument('--host', default='localhost', help='Host header of requests, must be allowed.')
+
+    def handle(self, *args, **options):
+        from movies.asgi import application
+
+        try:
+            results = asyncio.run(load_test.run_load_test(
+                application, options['duration'], options['readers'], options['writers'], options['upstream_delay'],
+                options['host'],
+            ))
+        finally:
+            load_test.delete_created_movies()
+
+        ratio = results['reads_per_second_under_load'] / results['reads_per_second']
+        self.stdout.write(
+            f"GET /movies: {results['reads_per_second']:.1f} reads/s alone, "
+            f"{results['reads_per_second_under_load']:.1f} reads/s under load ({ratio:.0%})\n"
+            f"POST /movies: {options['writers']} requests, {results['writes_in_flight']} in flight during measurement, "
+            f"{results['failed_writes']} failed"
+        )
+        if ratio < options['min_ratio']:
+            raise CommandError(f'Read throughput under load dropped to {ratio:.0%}.')
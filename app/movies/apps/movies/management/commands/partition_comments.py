@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.apps.movies import models
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates monthly partitions of comments for the next months, should be run regularly, for example daily. '
+        'With --convert, converts comments table to partitions first, the table is locked while comments are copied.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=3,
+            help='Number of months after the current one to create partitions for, 3 by default.'
+        )
+        parser.add_argument('--convert', action='store_true', help='Converts comments table to partitions.')
+
+    def handle(self, *args, **options):
+        if not models.Comment.objects.is_partitioned():
+            if not options['convert']:
+                raise CommandError('Comments table is not partitioned, run with --convert to convert it.')
+            models.Comment.objects.partition_by_month(options['months_ahead'])
+            self.stdout.write('Converted comments table to monthly partitions.')
+        elif options['convert']:
+            self.stdout.write('Comments table is already partitioned.')
+
+        created = models.Comment.objects.create_partitions(options['months_ahead'])
+        self.stdout.write(f"Created {len(created)} partitions{': ' if created else '.'}{', '.join(created)}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movies.apps.movies import models
+
+
+class Command(BaseCommand):
+    help = 'Recomputes daily and total comment counts and trending scores of all movies from comments.'
+
+    def handle(self, *args, **options):
+        models.MovieDailyCommentCount.objects.rebuild()
+        self.stdout.write(f'Rebuilt {models.MovieDailyCommentCount.objects.count()} daily comment counts.')
@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from movies.apps.movies import services
+from movies.utils import TokenBucket, try_session_lock
+
+
+class Command(BaseCommand):
+    help = (
+        'Fetches stale movies again from OMDb API, stalest first, within OMDb API rate limit. '
+        'Can be stopped at any time, the next run continues with movies which were not refreshed yet. '
+        'Expired OMDb API responses are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=float, default=settings.MOVIE_REFRESH_AGE,
+            help='Refreshes movies fetched more than this many seconds ago, MOVIE_REFRESH_AGE by default.'
+        )
+        parser.add_argument('--limit', type=int, help='Max number of movies to refresh, all stale ones by default.')
+        parser.add_argument(
+            '--rate', type=float, default=settings.MOVIE_REFRESH_RATE,
+            help='OMDb API requests per second, MOVIE_REFRESH_RATE by default.'
+        )
+        parser.add_argument(
+            '--burst', type=int, default=settings.MOVIE_REFRESH_BURST,
+            help='Max number of OMDb API requests made at once after idle time, MOVIE_REFRESH_BURST by default.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true', help='Keeps running, checks for stale movies every --interval seconds.'
+        )
+        parser.add_argument('--interval', type=float, default=600, help='Seconds between checks with --loop.')
+
+    def handle(self, *args, **options):
+        # shared by all passes, so the rate limit holds across them
+        rate_limiter = TokenBucket(options['rate'], options['burst'])
+        log = self.stdout.write if options['verbosity'] > 1 else None
+
+        while True:
+            with try_session_lock('refresh-movies') as locked:
+                if locked:
+                    refreshed, failed = services.refresh_stale_movies(
+                        timedelta(seconds=options['older_than']), options['limit'], rate_limiter, log
+                    )
+                    self.stdout.write(f'Refreshed {refreshed} movies, {failed} failed.')
+                    deleted = services.CachedOMDBAPI.delete_expired()
+                    if deleted:
+                        self.stdout.write(f'Deleted {deleted} expired OMDb API responses.')
+                else:
+                    self.stdout.write('Another refresh is running.')
+
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
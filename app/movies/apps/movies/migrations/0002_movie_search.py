@@ -0,0 +1,69 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import DatabaseError, migrations, models, transaction
+
+
+def _search_value_sql(fields, separator):
+    values = [
+        f"(CASE WHEN jsonb_typeof(external_data -> '{field}') = 'string' THEN external_data ->> '{field}' ELSE '' END)"
+        for field in fields
+    ]
+    return f" || {separator} || ".join(values)
+
+
+SPACE = "' '"
+NEWLINE = "E'\\n'"
+
+BACKFILL_SEARCH_SQL = f"""
+UPDATE movies_movie SET
+    search_vector =
+        setweight(to_tsvector('english', {_search_value_sql(['Title'], SPACE)}), 'A') ||
+        setweight(to_tsvector('english', {_search_value_sql(['Director', 'Writer', 'Actors'], SPACE)}), 'B') ||
+        setweight(to_tsvector('english', {_search_value_sql(['Production'], SPACE)}), 'C'),
+    search_text = {_search_value_sql(['Title', 'Director', 'Writer', 'Actors', 'Production'], NEWLINE)}
+"""
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm is optional, search falls back to JSON lookups when it's not available
+    try:
+        with transaction.atomic(), schema_editor.connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                'CREATE INDEX movies_movie_search_text_trgm ON movies_movie USING gin (UPPER(search_text) gin_trgm_ops)'
+            )
+    except DatabaseError:
+        pass
+
+
+def drop_trigram_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP INDEX IF EXISTS movies_movie_search_text_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='search_text',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='movies_movi_search__eaebc6_gin'),
+        ),
+        migrations.RunSQL(BACKFILL_SEARCH_SQL, migrations.RunSQL.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
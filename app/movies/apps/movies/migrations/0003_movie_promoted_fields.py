@@ -0,0 +1,65 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+from movies.utils import parse_omdb_date, parse_omdb_decimal, parse_omdb_int, parse_omdb_runtime, parse_omdb_year
+
+PROMOTED_FIELDS = {
+    'Year': ('year', parse_omdb_year),
+    'imdbRating': ('imdb_rating', parse_omdb_decimal),
+    'Runtime': ('runtime_minutes', parse_omdb_runtime),
+    'imdbVotes': ('imdb_votes', parse_omdb_int),
+    'Released': ('released', parse_omdb_date),
+}
+BATCH_SIZE = 1000
+
+
+def backfill_promoted_fields(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    columns = [column for column, _ in PROMOTED_FIELDS.values()]
+
+    batch = []
+    for movie in Movie.objects.only('external_data').iterator(chunk_size=BATCH_SIZE):
+        for field, (column, parse) in PROMOTED_FIELDS.items():
+            setattr(movie, column, parse(movie.external_data.get(field)))
+        batch.append(movie)
+        if len(batch) == BATCH_SIZE:
+            Movie.objects.bulk_update(batch, columns)
+            batch = []
+    Movie.objects.bulk_update(batch, columns)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_movie_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_rating',
+            field=models.DecimalField(db_index=True, decimal_places=1, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_votes',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='released',
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='runtime_minutes',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='year',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_promoted_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL_COUNTS_SQL = """
+INSERT INTO movies_moviedailycommentcount (movie_id, day, total)
+SELECT movie_id, (added_on AT TIME ZONE 'UTC')::date, COUNT(*) FROM movies_comment GROUP BY 1, 2
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_movie_promoted_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieDailyCommentCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('total', models.PositiveIntegerField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='movies.Movie')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='moviedailycommentcount',
+            constraint=models.UniqueConstraint(fields=('movie', 'day'), name='unique_movie_day'),
+        ),
+        migrations.RunSQL(BACKFILL_COUNTS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:24
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_moviedailycommentcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OMDBCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.TextField(unique=True)),
+                ('content', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('error', models.TextField(null=True)),
+                ('expires_on', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+from movies.utils import normalize_title
+
+BATCH_SIZE = 1000
+
+
+def backfill_identity(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+
+    imdb_ids = set()
+    batch = []
+    for movie in Movie.objects.only('external_data').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        title = movie.external_data.get('Title')
+        movie.title_key = normalize_title(title) if isinstance(title, str) else ''
+
+        # duplicates created before imdbID was unique keep their data, only the oldest one gets the id
+        imdb_id = movie.external_data.get('imdbID')
+        if isinstance(imdb_id, str) and imdb_id and imdb_id not in imdb_ids:
+            movie.imdb_id = imdb_id
+            imdb_ids.add(imdb_id)
+
+        batch.append(movie)
+        if len(batch) == BATCH_SIZE:
+            Movie.objects.bulk_update(batch, ['title_key', 'imdb_id'])
+            batch = []
+    Movie.objects.bulk_update(batch, ['title_key', 'imdb_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_omdbcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_id',
+            field=models.CharField(max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='title_key',
+            field=models.TextField(db_index=True, default=''),
+        ),
+        migrations.RunPython(backfill_identity, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='movie',
+            name='imdb_id',
+            field=models.CharField(max_length=20, null=True, unique=True),
+        ),
+    ]
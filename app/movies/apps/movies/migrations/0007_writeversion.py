@@ -0,0 +1,22 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_movie_identity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WriteVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('version', models.BigIntegerField()),
+                ('modified_on', models.DateTimeField()),
+            ],
+        ),
+    ]
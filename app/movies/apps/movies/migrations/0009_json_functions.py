@@ -0,0 +1,113 @@
+from django.db import migrations
+
+# Functions rendering rows to the same JSON the API renders from serialize(), that is json.dumps() output
+# in compact form of values loaded from database. Keys of jsonb objects are loaded in their stored order,
+# json.loads() turns numbers with a fraction into floats, which are rendered by repr() and
+# need the same formatting.
+CREATE_FUNCTIONS_SQL = """
+CREATE OR REPLACE FUNCTION movies_json_float(value text) RETURNS text AS $$
+DECLARE
+    shortest text := value::float8::text;
+    negative boolean := left(shortest, 1) = '-';
+    exponent integer := 0;
+    digits text;
+    point integer;
+BEGIN
+    shortest := ltrim(shortest, '-');
+    IF position('e' IN shortest) > 0 THEN
+        exponent := split_part(shortest, 'e', 2)::integer;
+        shortest := split_part(shortest, 'e', 1);
+    END IF;
+    digits := split_part(shortest, '.', 1) || split_part(shortest, '.', 2);
+    point := length(split_part(shortest, '.', 1)) + exponent - (length(digits) - length(ltrim(digits, '0')));
+    digits := rtrim(ltrim(digits, '0'), '0');
+
+    IF digits = '' THEN
+        shortest := '0.0';
+    ELSIF point <= -4 OR point > 16 THEN
+        shortest := left(digits, 1) || CASE WHEN length(digits) > 1 THEN '.' || substr(digits, 2) ELSE '' END ||
+            'e' || CASE WHEN point - 1 < 0 THEN '-' ELSE '+' END ||
+            CASE WHEN abs(point - 1) < 10 THEN '0' ELSE '' END || abs(point - 1);
+    ELSIF point <= 0 THEN
+        shortest := '0.' || repeat('0', -point) || digits;
+    ELSIF point >= length(digits) THEN
+        shortest := digits || repeat('0', point - length(digits)) || '.0';
+    ELSE
+        shortest := left(digits, point) || '.' || substr(digits, point + 1);
+    END IF;
+    RETURN CASE WHEN negative THEN '-' ELSE '' END || shortest;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE STRICT;
+
+CREATE OR REPLACE FUNCTION movies_json(value jsonb) RETURNS text AS $$
+BEGIN
+    CASE jsonb_typeof(value)
+    WHEN 'object' THEN
+        RETURN '{' || coalesce((
+            SELECT string_agg(
+                to_json(key)::text || ':' ||
+                CASE WHEN jsonb_typeof(item) IN ('string', 'boolean', 'null') THEN item::text ELSE movies_json(item) END,
+                ',' ORDER BY position
+            )
+            FROM jsonb_each(value) WITH ORDINALITY AS entries(key, item, position)
+        ), '') || '}';
+    WHEN 'array' THEN
+        RETURN '[' || coalesce((
+            SELECT string_agg(
+                CASE WHEN jsonb_typeof(item) IN ('string', 'boolean', 'null') THEN item::text ELSE movies_json(item) END,
+                ',' ORDER BY position
+            )
+            FROM jsonb_array_elements(value) WITH ORDINALITY AS elements(item, position)
+        ), '') || ']';
+    WHEN 'number' THEN
+        RETURN CASE WHEN position('.' IN value::text) > 0 THEN movies_json_float(value::text) ELSE value::text END;
+    ELSE
+        RETURN value::text;
+    END CASE;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE STRICT;
+
+-- same as Movie.serialize(), id is added as the last key unless external data already has it
+CREATE OR REPLACE FUNCTION movies_movie_json(external_data jsonb, id integer) RETURNS text AS $$
+    SELECT CASE
+        WHEN external_data ? 'id' THEN movies_json(jsonb_set(external_data, '{id}', to_jsonb(id)))
+        WHEN external_data = '{}' THEN '{"id":' || id || '}'
+        ELSE left(movies_json(external_data), -1) || ',"id":' || id || '}'
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- same as Comment.serialize(), added_on is rendered by datetime.isoformat() in UTC
+CREATE OR REPLACE FUNCTION movies_comment_json(movie_id integer, comment text, added_on timestamptz, id integer)
+RETURNS text AS $$
+    SELECT '{"movie_id":' || movie_id ||
+        ',"comment":' || to_json(comment)::text ||
+        ',"added_on":"' || to_char(added_on AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS') ||
+        CASE WHEN to_char(added_on, 'US') = '000000' THEN '' ELSE '.' || to_char(added_on, 'US') END ||
+        '+00:00","id":' || id || '}'
+$$ LANGUAGE sql STABLE;
+
+-- same as Movie.serialize_ranked()
+CREATE OR REPLACE FUNCTION movies_ranked_movie_json(movie_id integer, rank bigint, total_comments bigint)
+RETURNS text AS $$
+    SELECT '{"movie_id":' || movie_id || ',"rank":' || rank || ',"total_comments":' || total_comments || '}'
+$$ LANGUAGE sql IMMUTABLE;
+"""
+
+DROP_FUNCTIONS_SQL = """
+DROP FUNCTION movies_ranked_movie_json(integer, bigint, bigint);
+DROP FUNCTION movies_comment_json(integer, text, timestamptz, integer);
+DROP FUNCTION movies_movie_json(jsonb, integer);
+DROP FUNCTION movies_json(jsonb);
+DROP FUNCTION movies_json_float(text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_movie_updated_on'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_FUNCTIONS_SQL, DROP_FUNCTIONS_SQL),
+    ]
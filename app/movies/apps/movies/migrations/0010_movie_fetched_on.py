@@ -0,0 +1,25 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_json_functions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='fetched_on',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        # existing movies were fetched when they were last written
+        migrations.RunSQL('UPDATE movies_movie SET fetched_on = updated_on', migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['fetched_on', 'id'], name='movies_movie_fetched_on_id'),
+        ),
+    ]
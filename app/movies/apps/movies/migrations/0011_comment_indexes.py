@@ -0,0 +1,29 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:50
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_movie_fetched_on'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['movie', 'added_on', 'id'], name='movies_comment_movie_added'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['added_on'], name='movies_comment_added_brin'),
+        ),
+        # replaced by the composite index
+        migrations.AlterField(
+            model_name='comment',
+            name='movie',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, to='movies.Movie'),
+        ),
+    ]
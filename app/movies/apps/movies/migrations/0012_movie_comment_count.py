@@ -0,0 +1,32 @@
+# Generated by Django 2.2.6 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+BACKFILL_COUNTS_SQL = """
+UPDATE movies_movie SET comment_count = counts.total
+FROM (SELECT movie_id, SUM(total) AS total FROM movies_moviedailycommentcount GROUP BY movie_id) AS counts
+WHERE movies_movie.id = counts.movie_id
+"""
+
+# title prefixes are matched with LIKE, matches are ranked by comment_count without reading the table
+CREATE_SUGGEST_INDEX_SQL = """
+CREATE INDEX movies_movie_suggest ON movies_movie (title_key text_pattern_ops) INCLUDE (comment_count, id)
+"""
+DROP_SUGGEST_INDEX_SQL = 'DROP INDEX movies_movie_suggest'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_COUNTS_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_SUGGEST_INDEX_SQL, DROP_SUGGEST_INDEX_SQL),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.6 on 2026-10-18 16:12
+
+from django.db import migrations, models
+
+from movies.utils import parse_omdb_end_year
+
+BATCH_SIZE = 1000
+
+
+def backfill_end_year(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+
+    batch = []
+    for movie in Movie.objects.only('external_data').iterator(chunk_size=BATCH_SIZE):
+        movie.end_year = parse_omdb_end_year(movie.external_data.get('Year'))
+        batch.append(movie)
+        if len(batch) == BATCH_SIZE:
+            Movie.objects.bulk_update(batch, ['end_year'])
+            batch = []
+    Movie.objects.bulk_update(batch, ['end_year'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_movie_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='end_year',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.RunPython(backfill_end_year, migrations.RunPython.noop),
+        # after backfill, so it isn't updated row by row
+        migrations.AlterField(
+            model_name='movie',
+            name='end_year',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.6 on 2026-10-18 14:22
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+
+# see Movie.get_trending_score()
+BACKFILL_SCORES_SQL = """
+UPDATE movies_movie SET trending_score = scores.score FROM (
+    SELECT movie_id, largest + LN(SUM(EXP(GREATEST(exponent - largest, -700)))) AS score FROM (
+        SELECT movie_id, exponent, MAX(exponent) OVER (PARTITION BY movie_id) AS largest FROM (
+            SELECT movie_id, %s * EXTRACT(EPOCH FROM added_on)::double precision AS exponent FROM movies_comment
+        ) AS exponents
+    ) AS shifted GROUP BY movie_id, largest
+) AS scores WHERE movies_movie.id = scores.movie_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0013_movie_end_year'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='trending_score',
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunSQL(
+            [(BACKFILL_SCORES_SQL, [math.log(2) / settings.TRENDING_HALF_LIFE])], migrations.RunSQL.noop
+        ),
+        # after the backfill, so the index is built once
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(
+                condition=models.Q(trending_score__isnull=False), fields=['-trending_score', 'id'],
+                name='movies_movie_trending'
+            ),
+        ),
+    ]
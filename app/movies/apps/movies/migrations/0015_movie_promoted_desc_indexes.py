@@ -0,0 +1,26 @@
+# Generated by Django 2.2.6 on 2026-10-18 15:02
+
+from django.db import migrations
+
+PROMOTED_COLUMNS = ['year', 'imdb_rating', 'runtime_minutes', 'imdb_votes', 'released']
+
+
+# ascending order with nulls last is read from plain btree indexes of the columns, descending order puts nulls
+# first in them, so it needs its own index, see MovieQuerySet.order_by_external_field()
+def create_desc_index_sql(column):
+    return f'CREATE INDEX movies_movie_{column}_desc ON movies_movie ({column} DESC NULLS LAST, id DESC)'
+
+
+def drop_desc_index_sql(column):
+    return f'DROP INDEX movies_movie_{column}_desc'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0014_movie_trending_score'),
+    ]
+
+    operations = [
+        migrations.RunSQL(create_desc_index_sql(column), drop_desc_index_sql(column)) for column in PROMOTED_COLUMNS
+    ]
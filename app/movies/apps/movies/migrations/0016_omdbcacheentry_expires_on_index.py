@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 14:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0015_movie_promoted_desc_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='omdbcacheentry',
+            name='expires_on',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -1,21 +1,159 @@
+import csv
+import io
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
 from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.fields.jsonb import KeyTextTransform
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
 from django.core.exceptions import FieldError
-from django.db import models
-from django.db.models import Q, Count, Window, F
-from django.db.models.functions import Rank
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Q, Count, Window, F, Func, Value, OuterRef, Subquery, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, Rank
+from django.utils import timezone
+
+from movies.utils import (
+    is_postgres_extension_installed,
+    normalize_title,
+    parse_omdb_date,
+    parse_omdb_decimal,
+    parse_omdb_end_year,
+    parse_omdb_int,
+    parse_omdb_runtime,
+    parse_omdb_year,
+)
 
 
 class MovieQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.sync_external_fields()
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            WriteVersion.objects.db_manager(self.db).bump([Movie.WRITE_VERSION_KEY])
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs, fields = list(objs), list(fields)
+        if not objs:
+            return
+        # columns derived from external_data are kept in sync and updated_on is set, same as by save()
+        if 'external_data' in fields:
+            for obj in objs:
+                obj.sync_external_fields()
+            fields.extend(Movie.DERIVED_FIELDS)
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_on = now
+        fields.append('updated_on')
+        with transaction.atomic(using=self.db):
+            super().bulk_update(objs, list(dict.fromkeys(fields)), *args, **kwargs)
+            WriteVersion.objects.db_manager(self.db).bump([Movie.WRITE_VERSION_KEY])
+
     def search(self, search):
-        search_fields = ['Title', 'Director', 'Writer', 'Actors', 'Production']
-        query = Q()
-        for field in search_fields:
-            query |= Q(**{f'external_data__{field}__icontains': search})
-        return self.filter(query)
+        # without pg_trgm substring matching of search_text can't use an index, fall back to plain JSON lookups
+        if not is_postgres_extension_installed('pg_trgm', self.db):
+            query = Q()
+            for field in Movie.SEARCH_FIELDS:
+                query |= Q(**{f'external_data__{field}__icontains': search})
+            return self.filter(query)
+
+        search_query = SearchQuery(search, config=Movie.SEARCH_CONFIG)
+        return self.filter(
+            Q(search_vector=search_query) | Q(search_text__icontains=search)
+        ).annotate(
+            # ts_rank is real, cast to double precision, so rank stored in pagination cursor compares equal to it
+            search_rank=Cast(SearchRank(F('search_vector'), search_query), models.FloatField())
+        ).order_by('-search_rank', 'pk')
+
+    def suggest(self, prefix, limit):
+        """
+        :return: list of dicts with id and Title of at most limit movies whose normalized title starts with prefix,
+            most commented first.
+        """
+        key = normalize_title(prefix)
+        # trailing space of prefix ends a word, "star " shouldn't match "Stardust"
+        if key and prefix[-1].isspace():
+            key += ' '
+        # top movies are found in the index alone, only their titles are read from the table
+        top = self.filter(title_key__startswith=key).order_by('-comment_count', 'pk').values('pk')[:limit]
+        return [
+            {'id': pk, 'Title': title}
+            for pk, title in self.filter(pk__in=top).order_by('-comment_count', 'pk').values_list(
+                'pk', KeyTextTransform('Title', 'external_data')
+            )
+        ]
+
+    def facets(self, fields, limit):
+        """
+        Counts values of external_data fields in one pass over movies. Values of LIST_FIELDS, such as "Crime, Drama",
+        are counted separately, "decade" is counted from year, missing and "N/A" values aren't counted.
+        :return: (int, dict)  # Tuple of number of movies and dict of field to list of at most limit most common
+            values, dicts with value and count.
+        """
+        movies_sql, movies_params = self.order_by().values('external_data', 'year').query.sql_with_params()
+        values_sql, values_params = [], []
+        for field in fields:
+            if field == 'decade':
+                values_sql.append("SELECT 'decade', (movie.year / 10 * 10)::text || 's'")
+            elif field in Movie.LIST_FIELDS:
+                values_sql.append(
+                    "SELECT %s, trim(value) FROM unnest(string_to_array(movie.external_data ->> %s, ',')) AS value"
+                )
+                values_params += [field, field]
+            else:
+                values_sql.append('SELECT %s, movie.external_data ->> %s')
+                values_params += [field, field]
+
+        # movies are scanned once, counted and used by all facets
+        sql = f"""
+            WITH movies AS ({movies_sql}),
+            counts AS (
+                SELECT facet.field, facet.value, count(*) AS count
+                FROM movies AS movie CROSS JOIN LATERAL ({' UNION ALL '.join(values_sql)}) AS facet (field, value)
+                WHERE facet.value IS NOT NULL AND facet.value NOT IN ('', 'N/A')
+                GROUP BY facet.field, facet.value
+            )
+            SELECT NULL, NULL, count(*), 0 FROM movies
+            UNION ALL
+            SELECT * FROM (
+                SELECT field, value, count, row_number() OVER (PARTITION BY field ORDER BY count DESC, value)
+                FROM counts
+            ) AS ranked
+            WHERE row_number <= %s
+            ORDER BY 1 NULLS FIRST, 4
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, [*movies_params, *values_params, limit])
+            (_, _, total, _), *rows = cursor.fetchall()
+
+        facets = {field: [] for field in fields}
+        for field, value, count, _ in rows:
+            facets[field].append({'value': value, 'count': count})
+        return total, facets
 
     def filter_by_year(self, year):
+        if year.isdigit():
+            return self.filter(year=int(year))
         return self.filter(external_data__Year__iexact=year)
 
+    def filter_by_year_range(self, year_from=None, year_to=None):
+        """
+        Movies released or running in any year of the range, bounds are inclusive and optional.
+        Series without end year are still running, movies without year are skipped.
+        """
+        queryset = self.filter(year__isnull=False)
+        if year_to is not None:
+            queryset = queryset.filter(year__lte=year_to)
+        if year_from is not None:
+            queryset = queryset.filter(Q(end_year__gte=year_from) | Q(end_year__isnull=True))
+        return queryset
+
     def order_by_external_field(self, field):
         if field.startswith('-'):
             prefix, *field = field
@@ -23,44 +161,263 @@ class MovieQuerySet(models.QuerySet):
         else:
             prefix, field = '', field
 
+        # promoted fields are sorted by their typed column, entries without valid value go last,
+        # pk breaks ties in the same direction, like in cursor pagination, so pages don't overlap
+        # and descending order is read from movies_movie_<column>_desc indexes
+        if field in Movie.PROMOTED_FIELDS:
+            column, _ = Movie.PROMOTED_FIELDS[field]
+            if prefix:
+                return self.order_by(F(column).desc(nulls_last=True), '-pk')
+            return self.order_by(F(column).asc(nulls_last=True), 'pk')
+
         # don't fail in case of invalid field name, such as 'Ye ar'
         try:
             return self.order_by(f'{prefix}external_data__{field}')
         except FieldError:
             return self
 
+    def select_external_fields(self, fields):
+        """
+        Loads only given keys of external data instead of the whole document, serialize() returns only them and id.
+        Keys keep the order they have in the whole document, missing keys are skipped.
+        """
+        external_data = f'"{self.model._meta.db_table}"."external_data"'
+        subset = ' || '.join(
+            f"(CASE WHEN {external_data} ? %s THEN jsonb_build_object(%s, {external_data} -> %s) ELSE '{{}}' END)"
+            for _ in fields
+        )
+        return self.defer('external_data').annotate(selected_external_data=RawSQL(
+            f"('{{}}'::jsonb || {subset})", [param for field in fields for param in (field, field, field)],
+            output_field=JSONField()
+        ))
+
+    def with_json(self):
+        """
+        Annotates movies with `json` - output of JSONRenderer for serialize(), rendered by postgres.
+        """
+        external_data = 'external_data'
+        if 'selected_external_data' in self.query.annotations:
+            external_data = 'selected_external_data'
+        return self.annotate(json=Func(
+            F(external_data), F('pk'), function='movies_movie_json', output_field=models.TextField()
+        ))
+
+    def with_ranked_json(self):
+        """
+        Annotates ranked movies with `json` - output of JSONRenderer for serialize_ranked(), rendered by postgres.
+        """
+        return self.annotate(json=Func(
+            F('pk'), F('rank'), F('total_comments'), function='movies_ranked_movie_json', output_field=models.TextField()
+        ))
+
     def ranked(self, from_date, to_date):
-        queryset = self
-        queryset = queryset.filter(comment__added_on__gte=from_date, comment__added_on__lte=to_date)
+        from_date, to_date = _as_utc(from_date), _as_utc(to_date)
+
+        # whole days of the range are counted from daily totals, partial days at its edges from comments
+        first_day = from_date.date() if from_date.time() == time.min else from_date.date() + timedelta(days=1)
+        end_day = (to_date + timedelta(microseconds=1)).date()
+        if first_day < end_day:
+            edges = (
+                Q(added_on__gte=from_date, added_on__lt=_start_of_day(first_day)) |
+                Q(added_on__gte=_start_of_day(end_day), added_on__lte=to_date)
+            )
+        else:
+            edges = Q(added_on__gte=from_date, added_on__lte=to_date)
+
+        daily_counts = MovieDailyCommentCount.objects.filter(day__gte=first_day, day__lt=end_day)
+        edge_comments = Comment.objects.filter(edges).order_by()
+
+        daily_total = daily_counts.filter(
+            movie=OuterRef('pk')
+        ).values('movie').annotate(total=Sum('total')).values('total')
+        edge_total = edge_comments.filter(
+            movie=OuterRef('pk')
+        ).values('movie').annotate(total=Count('pk')).values('total')
 
         rank_by_total_comments = Window(
             expression=Rank(),
             order_by=F('total_comments').desc()
         )
 
-        return queryset.annotate(
-            total_comments=Count('comment')
+        return self.filter(
+            Q(pk__in=daily_counts.values('movie')) | Q(pk__in=edge_comments.values('movie'))
+        ).annotate(
+            total_comments=(
+                Coalesce(Subquery(daily_total, output_field=models.IntegerField()), 0) +
+                Coalesce(Subquery(edge_total, output_field=models.IntegerField()), 0)
+            )
         ).annotate(
             rank=rank_by_total_comments
         ).order_by('rank', 'id')
 
+    def trending(self):
+        """
+        Movies with comments, ordered by trending_score, read from its index instead of counting comments.
+        """
+        return self.filter(trending_score__isnull=False).order_by('-trending_score', 'pk')
+
 
 class MovieManager(models.Manager):
     def get_queryset(self):
-        return MovieQuerySet(self.model, using=self._db).order_by('pk')
+        # search columns are only used in SQL, don't load them
+        return MovieQuerySet(self.model, using=self._db).defer('search_vector', 'search_text').order_by('pk')
+
+    def increment_comment_counts(self, counts, trending_scores):
+        """
+        Adds comments to comment_count and trending_score in one statement.
+        :param counts: dict of movie id to number of added comments.
+        :param trending_scores: dict of movie id to trending score of added comments alone.
+        """
+        if not counts:
+            return
+        table = self.model._meta.db_table
+        # sorted, so concurrent transactions lock rows in the same order
+        rows = sorted((movie_id, total, trending_scores[movie_id]) for movie_id, total in counts.items())
+        values = ', '.join(['(%s, %s, %s::double precision)'] * len(rows))
+        # scores are logarithms, so their sum is log(exp(a) + exp(b)) = max + log(1 + exp(-difference)),
+        # the difference is capped, so exp() doesn't underflow
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET comment_count = {table}.comment_count + added.total, '
+                f'trending_score = COALESCE(GREATEST({table}.trending_score, added.score) + '
+                f'LN(1 + EXP(-LEAST(ABS({table}.trending_score - added.score), 700))), added.score) '
+                f'FROM (VALUES {values}) AS added (id, total, score) WHERE {table}.id = added.id',
+                [param for row in rows for param in row]
+            )
 
     def create_with_external_data(self, external_data):
         return self.create(external_data=external_data)
 
+    def get_or_create_with_external_data(self, external_data):
+        """
+        Returns movie with the same imdbID if it already exists, creates it otherwise.
+        """
+        imdb_id = Movie.get_imdb_id(external_data)
+        if imdb_id:
+            movie = self.filter(imdb_id=imdb_id).first()
+            if movie:
+                return movie
+        try:
+            with transaction.atomic(using=self.db):
+                return self.create_with_external_data(external_data)
+        except IntegrityError:
+            # created concurrently, for example under a different title
+            if not imdb_id:
+                raise
+            return self.get(imdb_id=imdb_id)
+
 
 class Movie(models.Model):
+    # searched fields and their full text search weights
+    SEARCH_FIELDS = {
+        'Title': 'A',
+        'Director': 'B',
+        'Writer': 'B',
+        'Actors': 'B',
+        'Production': 'C',
+    }
+    SEARCH_CONFIG = 'english'
+    # external_data fields with comma separated lists of values
+    LIST_FIELDS = ['Genre', 'Director', 'Writer', 'Actors', 'Language', 'Country']
+    WRITE_VERSION_KEY = 'movies'
+    # external_data fields copied to typed and indexed columns, used for filtering and ordering
+    PROMOTED_FIELDS = {
+        'Year': ('year', parse_omdb_year),
+        'imdbRating': ('imdb_rating', parse_omdb_decimal),
+        'Runtime': ('runtime_minutes', parse_omdb_runtime),
+        'imdbVotes': ('imdb_votes', parse_omdb_int),
+        'Released': ('released', parse_omdb_date),
+    }
+    # columns set by sync_external_fields()
+    DERIVED_FIELDS = [
+        'search_vector', 'search_text', 'title_key', 'imdb_id', 'end_year',
+        *(column for column, _ in PROMOTED_FIELDS.values())
+    ]
+
     objects = MovieManager()
 
     external_data = JSONField()
+    search_vector = SearchVectorField(null=True)
+    search_text = models.TextField(default='')
+    title_key = models.TextField(default='', db_index=True)
+    imdb_id = models.CharField(max_length=20, null=True, unique=True)
+    updated_on = models.DateTimeField(auto_now=True, db_index=True)
+    year = models.IntegerField(null=True, db_index=True)
+    # last year of series, same as year for movies, null while series is running
+    end_year = models.IntegerField(null=True, db_index=True)
+    imdb_rating = models.DecimalField(max_digits=3, decimal_places=1, null=True, db_index=True)
+    runtime_minutes = models.IntegerField(null=True, db_index=True)
+    imdb_votes = models.IntegerField(null=True, db_index=True)
+    released = models.DateField(null=True, db_index=True)
+    # when external_data was last fetched from OMDb API
+    fetched_on = models.DateTimeField(default=timezone.now)
+    # maintained on every comment insert, ranks title suggestions
+    comment_count = models.IntegerField(default=0)
+    # maintained on every comment insert, ranks trending movies, null while movie has no comments,
+    # see get_trending_score()
+    trending_score = models.FloatField(null=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            # stalest movies are refreshed first
+            models.Index(fields=['fetched_on', 'id'], name='movies_movie_fetched_on_id'),
+            models.Index(
+                fields=['-trending_score', 'id'], name='movies_movie_trending',
+                condition=Q(trending_score__isnull=False)
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        self.sync_external_fields()
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            WriteVersion.objects.db_manager(using).bump([self.WRITE_VERSION_KEY])
+
+    def sync_external_fields(self):
+        """
+        Updates columns derived from external_data, called before every insert and update.
+        """
+        title = self.external_data.get('Title')
+        self.title_key = normalize_title(title) if isinstance(title, str) else ''
+        self.imdb_id = self.get_imdb_id(self.external_data)
+
+        for field, (column, parse) in self.PROMOTED_FIELDS.items():
+            setattr(self, column, parse(self.external_data.get(field)))
+        self.end_year = parse_omdb_end_year(self.external_data.get('Year'))
+
+        vectors = {}
+        for field, weight in self.SEARCH_FIELDS.items():
+            vectors.setdefault(weight, []).append(self._get_search_value(field))
+
+        search_vector = None
+        for weight, values in sorted(vectors.items()):
+            vector = SearchVector(
+                Value(' '.join(values), output_field=models.TextField()),
+                weight=weight,
+                config=self.SEARCH_CONFIG
+            )
+            search_vector = vector if search_vector is None else search_vector + vector
+
+        self.search_vector = search_vector
+        # newline separated, so substring search doesn't match across fields
+        self.search_text = '\n'.join(self._get_search_value(field) for field in self.SEARCH_FIELDS)
+
+    @staticmethod
+    def get_imdb_id(external_data):
+        imdb_id = external_data.get('imdbID')
+        return imdb_id if isinstance(imdb_id, str) and imdb_id else None
+
+    def _get_search_value(self, field):
+        value = self.external_data.get(field)
+        return value if isinstance(value, str) else ''
 
     def serialize(self):
+        # movies loaded by select_external_fields() don't have whole external data
+        external_data = getattr(self, 'selected_external_data', None)
         return {
-            **self.external_data,
+            **(self.external_data if external_data is None else external_data),
             'id': self.pk
         }
 
@@ -71,23 +428,193 @@ class Movie(models.Model):
             'total_comments': self.total_comments,
         }
 
+    def get_trending_score(self, now):
+        """
+        trending_score is log of sum of comment weights 2 ** (added_on / TRENDING_HALF_LIFE), timestamps in seconds,
+        so it only grows, without rescaling scores of all movies as time passes, and its order is the same
+        as order of scores at any moment.
+        :return: number of comments, each weighing 1 when added and half as much every TRENDING_HALF_LIFE since.
+        """
+        return math.exp(self.trending_score - get_trending_rate() * now.timestamp())
+
+    def serialize_trending(self, now):
+        return {
+            'movie_id': self.pk,
+            'score': round(self.get_trending_score(now), 6),
+        }
+
 
 class CommentQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            _track_inserted_comments(objs, self.db)
+        return objs
+
     def filter_by_movie_id(self, id_):
         return self.filter(movie_id=id_)
 
+    def with_json(self):
+        """
+        Annotates comments with `json` - output of JSONRenderer for serialize(), rendered by postgres.
+        """
+        return self.annotate(json=Func(
+            F('movie_id'), F('comment'), F('added_on'), F('pk'),
+            function='movies_comment_json', output_field=models.TextField()
+        ))
+
 
 class CommentManager(models.Manager):
     def get_queryset(self):
         return CommentQuerySet(self.model, using=self._db).order_by('pk')
 
+    def copy_from(self, comments):
+        """
+        Inserts comments using postgres COPY, which is faster than bulk_create, but doesn't set their ids.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for comment in comments:
+            writer.writerow([comment.movie_id, comment.comment, comment.added_on.isoformat()])
+        buffer.seek(0)
+
+        with transaction.atomic(using=self.db), connections[self.db].cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {self.model._meta.db_table} (movie_id, comment, added_on) FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            _track_inserted_comments(comments, self.db)
+
+    def is_partitioned(self):
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT EXISTS(SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))',
+                [self.model._meta.db_table]
+            )
+            return cursor.fetchone()[0]
+
+    def partition_by_month(self, months_ahead):
+        """
+        Converts comments table to monthly range partitions on added_on, so queries of time ranges skip other months.
+        Rows of months without a partition go to the default partition. The table is locked while rows are copied.
+        Unique constraints of partitioned tables need to include added_on, so primary key becomes (id, added_on),
+        ids stay unique since they come from the same sequence.
+        :param months_ahead: number of months after the current one to create partitions for.
+        """
+        connection = connections[self.db]
+        table = self.model._meta.db_table
+        movie_field = self.model._meta.get_field('movie')
+        movie_table = movie_field.related_model._meta.db_table
+
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+                cursor.execute(f'SELECT MIN(added_on), MAX(added_on) FROM {table}')
+                first, last = cursor.fetchone()
+                cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+                sequence = cursor.fetchone()[0]
+
+                # sequence would be dropped together with the old table
+                cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+                cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_unpartitioned')
+                cursor.execute(
+                    f'CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (added_on)'
+                )
+                cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+                now = timezone.now()
+                self._create_month_partitions(
+                    cursor, min(first or now, now), _add_months(_as_utc(now), months_ahead)
+                )
+                cursor.execute(f'INSERT INTO {table} SELECT * FROM {table}_unpartitioned')
+                cursor.execute(f'DROP TABLE {table}_unpartitioned')
+                cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+
+                # constraints and indexes are created after the copy, which is faster
+                cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, added_on)')
+                cursor.execute(
+                    f'ALTER TABLE {table} ADD CONSTRAINT {table}_{movie_field.column}_fk '
+                    f'FOREIGN KEY ({movie_field.column}) REFERENCES {movie_table} (id) DEFERRABLE INITIALLY DEFERRED'
+                )
+            with connection.schema_editor(atomic=False) as schema_editor:
+                for index in self.model._meta.indexes:
+                    schema_editor.add_index(self.model, index)
+
+    def create_partitions(self, months_ahead):
+        """
+        Creates missing monthly partitions from the current month until months_ahead months after it,
+        comments of these months are moved out of the default partition. Table needs to be partitioned already.
+        """
+        now = _as_utc(timezone.now())
+        with transaction.atomic(using=self.db), connections[self.db].cursor() as cursor:
+            return self._create_month_partitions(cursor, now, _add_months(now, months_ahead))
+
+    def _create_month_partitions(self, cursor, first, last):
+        """
+        :param first: datetime within first month of partitions.
+        :param last: datetime within last month of partitions.
+        :return: list of names of created partitions.
+        """
+        table = self.model._meta.db_table
+        created = []
+        month = _as_utc(first).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        while month <= last:
+            next_month = _add_months(month, 1)
+            name = f'{table}_{month:%Y_%m}'
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+            if not cursor.fetchone()[0]:
+                bounds = f"FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+                cursor.execute(
+                    f'SELECT EXISTS(SELECT 1 FROM {table}_default WHERE added_on >= %s AND added_on < %s)',
+                    [month, next_month]
+                )
+                if cursor.fetchone()[0]:
+                    # new partition can't overlap rows of the default one, move them over
+                    cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {table}_default')
+                    cursor.execute(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}')
+                    cursor.execute(
+                        f'WITH moved AS (DELETE FROM {table}_default WHERE added_on >= %s AND added_on < %s '
+                        f'RETURNING *) INSERT INTO {table} SELECT * FROM moved',
+                        [month, next_month]
+                    )
+                    cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT')
+                else:
+                    cursor.execute(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}')
+                created.append(name)
+            month = next_month
+        return created
+
 
 class Comment(models.Model):
+    WRITE_VERSION_KEY = 'comments'
+
     objects = CommentManager()
-    movie = models.ForeignKey(Movie, on_delete=models.DO_NOTHING)
+    # covered by the (movie, added_on, id) index
+    movie = models.ForeignKey(Movie, on_delete=models.DO_NOTHING, db_index=False)
     comment = models.TextField()
     added_on = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            # comments of a movie, within a time range for /top
+            models.Index(fields=['movie', 'added_on', 'id'], name='movies_comment_movie_added'),
+            # comments are added in roughly chronological order, so a tiny block range index serves time ranges
+            BrinIndex(fields=['added_on'], name='movies_comment_added_brin'),
+        ]
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            _track_inserted_comments([self], using)
+
+    @staticmethod
+    def get_movie_write_version_key(movie_id):
+        return f'comments:movie:{movie_id}'
+
     def serialize(self):
         return {
             'movie_id': self.movie_id,
@@ -95,3 +622,214 @@ class Comment(models.Model):
             'added_on': self.added_on.isoformat(),
             'id': self.pk,
         }
+
+
+class MovieDailyCommentCountManager(models.Manager):
+    def increment(self, counts):
+        """
+        :param counts: dict of (movie id, day) to number of comments added that day.
+        """
+        if not counts:
+            return
+        values = ', '.join(['(%s, %s, %s)'] * len(counts))
+        params = [param for (movie_id, day), total in counts.items() for param in (movie_id, day, total)]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} (movie_id, day, total) VALUES {values} '
+                f'ON CONFLICT (movie_id, day) DO UPDATE SET total = {self.model._meta.db_table}.total + EXCLUDED.total',
+                params
+            )
+
+    def rebuild(self):
+        table = self.model._meta.db_table
+        comment_table = Comment._meta.db_table
+        movie_table = Movie._meta.db_table
+        with transaction.atomic(using=self.db), connections[self.db].cursor() as cursor:
+            # block comment inserts, so none of them is counted twice or missed
+            cursor.execute(f'LOCK TABLE {comment_table} IN SHARE MODE')
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(
+                f"INSERT INTO {table} (movie_id, day, total) "
+                f"SELECT movie_id, (added_on AT TIME ZONE 'UTC')::date, COUNT(*) FROM {comment_table} GROUP BY 1, 2"
+            )
+            cursor.execute(
+                f'UPDATE {movie_table} SET comment_count = '
+                f'COALESCE((SELECT SUM(total) FROM {table} WHERE movie_id = {movie_table}.id), 0)'
+            )
+            # see Movie.get_trending_score(), exponents are shifted by the largest one of each movie
+            cursor.execute(f'UPDATE {movie_table} SET trending_score = NULL WHERE trending_score IS NOT NULL')
+            cursor.execute(
+                f'UPDATE {movie_table} SET trending_score = scores.score FROM ('
+                f'SELECT movie_id, largest + LN(SUM(EXP(GREATEST(exponent - largest, -700)))) AS score FROM ('
+                f'SELECT movie_id, exponent, MAX(exponent) OVER (PARTITION BY movie_id) AS largest FROM ('
+                f'SELECT movie_id, %s * EXTRACT(EPOCH FROM added_on)::double precision AS exponent '
+                f'FROM {comment_table}) AS exponents) AS shifted GROUP BY movie_id, largest'
+                f') AS scores WHERE {movie_table}.id = scores.movie_id',
+                [get_trending_rate()]
+            )
+
+
+class MovieDailyCommentCount(models.Model):
+    """
+    Number of comments added to movie on given day (UTC), maintained on every comment insert.
+    """
+    objects = MovieDailyCommentCountManager()
+
+    movie = models.ForeignKey(Movie, on_delete=models.DO_NOTHING)
+    day = models.DateField(db_index=True)
+    total = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['movie', 'day'], name='unique_movie_day'),
+        ]
+
+
+class OMDBCacheEntryManager(models.Manager):
+    def get_fresh(self, keys):
+        """
+        :return: dict of key to not expired entry.
+        """
+        return {entry.key: entry for entry in self.filter(key__in=keys, expires_on__gt=timezone.now())}
+
+    def delete_expired(self, batch_size):
+        """
+        Deletes expired entries in batches, each in its own transaction, so writers of other entries
+        aren't blocked for long. Entries are overwritten when their title is requested again, others stay until then.
+        :return: number of deleted entries.
+        """
+        table = self.model._meta.db_table
+        deleted = 0
+        while True:
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE id IN ('
+                    f'SELECT id FROM {table} WHERE expires_on <= %s LIMIT %s FOR UPDATE SKIP LOCKED)',
+                    [timezone.now(), batch_size]
+                )
+                deleted += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    return deleted
+
+    def store(self, entries):
+        """
+        :param entries: dict of key to (content, error, expires_on) tuple.
+        """
+        if not entries:
+            return
+        connection = connections[self.db]
+        content_field = self.model._meta.get_field('content')
+        table = self.model._meta.db_table
+        values = ', '.join(['(%s, %s, %s, %s)'] * len(entries))
+        params = [
+            param
+            for key, (content, error, expires_on) in entries.items()
+            for param in (key, content_field.get_db_prep_value(content, connection), error, expires_on)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (key, content, error, expires_on) VALUES {values} '
+                f'ON CONFLICT (key) DO UPDATE SET '
+                f'content = EXCLUDED.content, error = EXCLUDED.error, expires_on = EXCLUDED.expires_on',
+                params
+            )
+
+
+class OMDBCacheEntry(models.Model):
+    """
+    OMDb API response for normalized title, error is set for responses which didn't find the movie.
+    """
+    objects = OMDBCacheEntryManager()
+
+    key = models.TextField(unique=True)
+    content = JSONField()
+    error = models.TextField(null=True)
+    expires_on = models.DateTimeField(db_index=True)
+
+
+class WriteVersionManager(models.Manager):
+    def bump(self, keys):
+        """
+        Increments versions of given keys, should be called in the same transaction as the write.
+        """
+        # sorted, so concurrent transactions lock rows in the same order
+        keys = sorted(set(keys))
+        if not keys:
+            return
+        table = self.model._meta.db_table
+        values = ', '.join(['(%s, 1, %s)'] * len(keys))
+        now = timezone.now()
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (key, version, modified_on) VALUES {values} '
+                f'ON CONFLICT (key) DO UPDATE SET version = {table}.version + 1, modified_on = EXCLUDED.modified_on',
+                [param for key in keys for param in (key, now)]
+            )
+
+    def get_version(self, key):
+        """
+        :return: (int, datetime or None)  # Tuple of version and time of last write, (0, None) if key was never written.
+        """
+        return self.filter(key=key).values_list('version', 'modified_on').first() or (0, None)
+
+
+class WriteVersion(models.Model):
+    """
+    Counter of writes to a set of data, such as all movies or comments of a movie.
+    Used as cheap validator of responses listing that data.
+    """
+    objects = WriteVersionManager()
+
+    key = models.CharField(max_length=255, unique=True)
+    version = models.BigIntegerField()
+    modified_on = models.DateTimeField()
+
+
+def get_trending_rate():
+    """
+    :return: natural log of comment weight growth per second, see Movie.get_trending_score().
+    """
+    return math.log(2) / settings.TRENDING_HALF_LIFE
+
+
+def _get_trending_scores(comments):
+    """
+    :return: dict of movie id to trending score of given comments.
+    """
+    rate = get_trending_rate()
+    exponents = defaultdict(list)
+    for comment in comments:
+        exponents[comment.movie_id].append(rate * _as_utc(comment.added_on).timestamp())
+    scores = {}
+    for movie_id, values in exponents.items():
+        # shifted by the largest exponent, so exp() doesn't overflow
+        largest = max(values)
+        scores[movie_id] = largest + math.log(sum(math.exp(value - largest) for value in values))
+    return scores
+
+
+def _track_inserted_comments(comments, using):
+    MovieDailyCommentCount.objects.db_manager(using).increment(
+        Counter((comment.movie_id, _as_utc(comment.added_on).date()) for comment in comments)
+    )
+    Movie.objects.db_manager(using).increment_comment_counts(
+        Counter(comment.movie_id for comment in comments), _get_trending_scores(comments)
+    )
+    WriteVersion.objects.db_manager(using).bump(
+        [Comment.WRITE_VERSION_KEY] + [Comment.get_movie_write_version_key(comment.movie_id) for comment in comments]
+    )
+
+
+def _as_utc(date):
+    if timezone.is_naive(date):
+        return timezone.make_aware(date, timezone.utc)
+    return date.astimezone(timezone.utc)
+
+
+def _add_months(date, months):
+    month = date.month - 1 + months
+    return date.replace(year=date.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def _start_of_day(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
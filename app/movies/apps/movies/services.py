@@ -1,51 +1,310 @@
 import json
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
 
 import requests
 from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
 from django.utils import timezone
 
+from movies import metrics
 from movies.apps.movies import models
+from movies.utils import acquire_transaction_lock, normalize_title, parse_date
+
+
+class OMDBAPIUnavailable(Exception):
+    pass
 
 
 class OMDBAPI:
     url = "http://www.omdbapi.com"
+    _session = None
+
+    @classmethod
+    def get_session(cls):
+        # shared between threads, keeps connections alive between requests
+        if cls._session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=settings.OMDB_API_CONCURRENCY)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            cls._session = session
+        return cls._session
 
     def get_movie(self, title):
         """
         :param title: title of movie to be requested.
-        :return: (dict, None or string)  # Tuple of response content and error. Error is None if request was successful.
-        """
-        response = requests.get(
-            OMDBAPI.url,
-            params={
-                't': title,
-                'apikey': settings.OMDB_API_KEY
-            }
-        )
-        content = json.loads(response.content)
+        :return: (dict, None, string or OMDBAPIUnavailable)  # Tuple of response content and error.
+            Error is None if request was successful.
+        """
+        return self._request({'t': title})
+
+    def get_movie_by_imdb_id(self, imdb_id):
+        """
+        Same as get_movie, but looks the movie up by its imdbID.
+        """
+        return self._request({'i': imdb_id})
+
+    def _request(self, params):
+        try:
+            with metrics.timed('omdb'):
+                response = self.get_session().get(
+                    OMDBAPI.url,
+                    params={
+                        **params,
+                        'apikey': settings.OMDB_API_KEY
+                    },
+                    timeout=settings.OMDB_API_TIMEOUT
+                )
+            content = response.json()
+        except (requests.RequestException, ValueError) as e:
+            return {}, OMDBAPIUnavailable(f'OMDb API request failed: {e}')
+
         if 'Error' in content:
             return {}, content['Error']
         else:
             return content, None
 
+    def get_movies(self, titles):
+        """
+        Requests movies concurrently, at most OMDB_API_CONCURRENCY at once.
+        :param titles: titles of movies to be requested.
+        :return: list of (dict, None, string or OMDBAPIUnavailable)  # Tuples of response content and error,
+            in order of titles.
+        """
+        if not titles:
+            return []
+        # not self.get_movie, so subclasses can reuse it for their misses
+        get_movie = metrics.bind_context(partial(OMDBAPI.get_movie, self))
+        with ThreadPoolExecutor(max_workers=min(settings.OMDB_API_CONCURRENCY, len(titles))) as executor:
+            return list(executor.map(get_movie, titles))
+
+
+class CachedOMDBAPI(OMDBAPI):
+    """
+    OMDBAPI storing responses in database, keyed by normalized title.
+    Found movies are kept for OMDB_CACHE_TTL seconds, errors for OMDB_CACHE_ERROR_TTL seconds.
+    """
+    # errors not related to requested title
+    uncached_errors = {'Invalid API key!', 'No API key provided.', 'Request limit reached!'}
+
+    stats = Counter()
+    _stats_lock = threading.Lock()
+
+    def get_movie(self, title):
+        return self.get_movies([title])[0]
+
+    def get_movies(self, titles):
+        keys = [normalize_title(title) for title in titles]
+        cached = self.get_cached(keys)
+
+        missing = list(dict.fromkeys(key for key in keys if key not in cached))
+        missing_titles = [titles[keys.index(key)] for key in missing]
+        fetched = dict(zip(missing, super().get_movies(missing_titles)))
+        self.store(fetched)
+
+        return [cached[key] if key in cached else fetched[key] for key in keys]
+
+    @classmethod
+    def get_cached(cls, keys):
+        """
+        :param keys: normalized titles, each of them is counted as a hit or miss.
+        :return: dict of key to (content, error) tuple of cached response.
+        """
+        cached = models.OMDBCacheEntry.objects.get_fresh(keys)
+        for key in keys:
+            if key in cached:
+                cls._count('error_hits' if cached[key].error is not None else 'hits')
+            else:
+                cls._count('misses')
+        return {key: (entry.content, entry.error) for key, entry in cached.items()}
+
+    @classmethod
+    def store(cls, fetched):
+        """
+        :param fetched: dict of normalized title to (content, error) tuple returned by OMDb API.
+        """
+        now = timezone.now()
+        to_store = {}
+        for key, (content, error) in fetched.items():
+            if error is None:
+                to_store[key] = (content, None, now + timedelta(seconds=settings.OMDB_CACHE_TTL))
+            elif isinstance(error, str) and error not in cls.uncached_errors:
+                to_store[key] = ({}, error, now + timedelta(seconds=settings.OMDB_CACHE_ERROR_TTL))
+        models.OMDBCacheEntry.objects.store(to_store)
+
+    @classmethod
+    def delete_expired(cls):
+        """
+        :return: number of deleted responses, which expired and weren't requested since.
+        """
+        return models.OMDBCacheEntry.objects.delete_expired(settings.OMDB_CACHE_DELETE_BATCH_SIZE)
+
+    @classmethod
+    def get_stats(cls):
+        with cls._stats_lock:
+            return dict(cls.stats)
+
+    @classmethod
+    def _count(cls, name):
+        with cls._stats_lock:
+            cls.stats[name] += 1
+
 
 def get_or_create_movie_by_title(title):
-    movie = models.Movie.objects.filter(external_data__title__iexact=title).first()
+    key = normalize_title(title)
+    movie = models.Movie.objects.filter(title_key=key).first()
 
     # movie doesn't exist in database, get data from external API
     if movie is None:
-        movie_data, error = OMDBAPI().get_movie(title)
+        with transaction.atomic():
+            # concurrent requests for the same title wait for the first one and reuse the movie it created
+            acquire_transaction_lock(f'movie-title:{key}')
+            movie = models.Movie.objects.filter(title_key=key).first()
+
+            if movie is None:
+                movie_data, error = CachedOMDBAPI().get_movie(title)
+
+                # fetch failed, return empty dict and error
+                if error is not None:
+                    return {}, error
+                # fetched movie data successfully, create it in database unless it exists under different title
+                movie = models.Movie.objects.get_or_create_with_external_data(movie_data)
+
+    return movie.serialize(), None
+
+
+def get_or_create_movies_by_titles(titles):
+    """
+    Batch version of get_or_create_movie_by_title, missing movies are fetched concurrently and created at once.
+    :return: list of (dict, None, string or OMDBAPIUnavailable)  # Tuples of movie data and error, in order of titles.
+    """
+    keys = [normalize_title(title) for title in titles]
+    existing = {movie.title_key: movie for movie in models.Movie.objects.filter(title_key__in=keys)}
+
+    missing = list(dict.fromkeys(key for key in keys if key not in existing))
+    missing_titles = [titles[keys.index(key)] for key in missing]
 
-        # fetched movie data successfully, create it in database
+    fetched, errors, movies = {}, {}, {}
+    for key, (movie_data, error) in zip(missing, CachedOMDBAPI().get_movies(missing_titles)):
         if error is None:
-            movie = models.Movie.objects.create_with_external_data(movie_data)
-            return movie.serialize(), None
-        # fetch failed, return empty dict and error
+            # different titles can point to the same movie, create it once
+            identity = models.Movie.get_imdb_id(movie_data) or key
+            movies.setdefault(identity, models.Movie(external_data=movie_data))
+            fetched[key] = identity
         else:
-            return {}, error
-    # movie exists in database, return it
-    else:
-        return movie.serialize(), None
+            errors[key] = error
+
+    # fetched movies can already exist under different title
+    movies.update({movie.imdb_id: movie for movie in models.Movie.objects.filter(imdb_id__in=list(movies))})
+    new_movies = {identity: movie for identity, movie in movies.items() if movie.pk is None}
+    try:
+        with transaction.atomic():
+            models.Movie.objects.bulk_create(new_movies.values())
+    except IntegrityError:
+        # some of them were created concurrently
+        for identity, movie in new_movies.items():
+            movies[identity] = models.Movie.objects.get_or_create_with_external_data(movie.external_data)
+
+    results = []
+    for key in keys:
+        if key in existing:
+            results.append((existing[key].serialize(), None))
+        elif key in errors:
+            results.append(({}, errors[key]))
+        else:
+            results.append((movies[fetched[key]].serialize(), None))
+    return results
+
+
+def refresh_stale_movies(older_than, limit=None, rate_limiter=None, log=None):
+    """
+    Fetches movies again from OMDb API, stalest first, in batches of MOVIE_REFRESH_BATCH_SIZE requested concurrently.
+    Each batch is written in its own transaction, so an interrupted refresh continues where it stopped when run again.
+    Movies with imdbID are looked up by it, others by title. Movies which failed to refresh keep their data and
+    are retried by the next refresh, the refresh stops early when a whole batch failed, for example over quota.
+    :param older_than: timedelta, movies fetched earlier than this long ago are refreshed.
+    :param limit: max number of movies to refresh, all stale movies by default.
+    :param rate_limiter: TokenBucket acquired before each OMDb API request.
+    :return: (int, int)  # Tuple of numbers of refreshed movies and movies which failed to refresh.
+    """
+    stale = models.Movie.objects.filter(fetched_on__lt=timezone.now() - older_than).order_by('fetched_on', 'pk')
+    refreshed = failed = 0
+    position = None
+
+    while limit is None or refreshed + failed < limit:
+        size = settings.MOVIE_REFRESH_BATCH_SIZE if limit is None else min(
+            settings.MOVIE_REFRESH_BATCH_SIZE, limit - refreshed - failed
+        )
+        batch = stale
+        if position is not None:
+            # movies which failed in this run stay stale, skip them
+            fetched_on, pk = position
+            batch = batch.filter(Q(fetched_on__gt=fetched_on) | Q(fetched_on=fetched_on, pk__gt=pk))
+        movies = list(batch[:size])
+        if not movies:
+            break
+        position = movies[-1].fetched_on, movies[-1].pk
+
+        batch_refreshed = _refresh_movies(movies, rate_limiter)
+        refreshed += batch_refreshed
+        failed += len(movies) - batch_refreshed
+        if log:
+            log(f'Refreshed {refreshed} movies, {failed} failed.')
+        if not batch_refreshed:
+            break
+
+    return refreshed, failed
+
+
+def _refresh_movies(movies, rate_limiter):
+    """
+    :return: number of movies refreshed and saved.
+    """
+    api = OMDBAPI()
+
+    def fetch(movie):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        if movie.imdb_id:
+            return api.get_movie_by_imdb_id(movie.imdb_id)
+        return api.get_movie(movie.external_data.get('Title', ''))
+
+    with ThreadPoolExecutor(max_workers=min(settings.OMDB_API_CONCURRENCY, len(movies))) as executor:
+        results = list(executor.map(metrics.bind_context(fetch), movies))
+
+    now = timezone.now()
+    fetched_imdb_ids = [models.Movie.get_imdb_id(movie_data) for movie_data, error in results if error is None]
+    taken_imdb_ids = dict(models.Movie.objects.filter(
+        imdb_id__in=[imdb_id for imdb_id in fetched_imdb_ids if imdb_id]
+    ).values_list('imdb_id', 'pk'))
+
+    updated, unchanged, cached = [], [], {}
+    for movie, (movie_data, error) in zip(movies, results):
+        if isinstance(error, OMDBAPIUnavailable) or error in CachedOMDBAPI.uncached_errors:
+            continue
+        # title can point to a different movie by now, don't turn this one into a duplicate,
+        # of a movie in the database or of one refreshed earlier in this batch
+        imdb_id = models.Movie.get_imdb_id(movie_data) if error is None else None
+        if error is None and not (imdb_id and taken_imdb_ids.setdefault(imdb_id, movie.pk) != movie.pk):
+            movie.external_data = movie_data
+            movie.fetched_on = now
+            updated.append(movie)
+            cached[normalize_title(movie_data.get('Title', ''))] = (movie_data, None)
+        else:
+            # movies which aren't found anymore or found as another movie keep their last data until next refresh,
+            # they aren't the stalest anymore, so they aren't fetched again by every run. Their columns aren't synced
+            # from external_data, duplicates from before imdbID was unique would take imdbID of the other movie.
+            unchanged.append(movie.pk)
+
+    models.Movie.objects.bulk_update(updated, ['external_data', 'fetched_on'])
+    models.Movie.objects.filter(pk__in=unchanged).update(fetched_on=now)
+    CachedOMDBAPI.store(cached)
+    return len(updated) + len(unchanged)
 
 
 def add_comment_to_movie(movie_id, comment):
@@ -56,3 +315,93 @@ def add_comment_to_movie(movie_id, comment):
         return comment.serialize(), None
     else:
         return {}, models.Movie.DoesNotExist(f'Movie with id {movie_id} does not exist.')
+
+
+def add_comments_to_movies(rows):
+    """
+    Validates all rows, then inserts valid ones in batches of BULK_COMMENTS_BATCH_SIZE.
+    :param rows: list of dicts with movie, comment and optional added_on (ISO 8601 datetime, now by default).
+    :return: (int, list)  # Tuple of number of added comments and list of errors of invalid rows,
+        such as {'row': 0, 'errors': {'movie': 'This field is required.'}}.
+    """
+    now = timezone.now()
+    comments, errors = [], []
+
+    # bool is a subclass of int, but true isn't an id, even though True == 1
+    movie_ids = {row.get('movie') for row in rows if isinstance(row, dict) and type(row.get('movie')) is int}
+    existing_ids = set(models.Movie.objects.filter(pk__in=movie_ids).order_by().values_list('pk', flat=True))
+
+    for number, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': {'non_field_errors': 'Row needs to be an object.'}})
+            continue
+
+        row_errors = {}
+        movie_id = row.get('movie')
+        if movie_id is None:
+            row_errors['movie'] = 'This field is required.'
+        elif type(movie_id) is not int or movie_id not in existing_ids:
+            row_errors['movie'] = f'Movie with id {movie_id} does not exist.'
+
+        comment = row.get('comment')
+        if not comment or not isinstance(comment, str):
+            row_errors['comment'] = 'This field is required.'
+
+        added_on = row.get('added_on') or now
+        if not isinstance(added_on, datetime):
+            added_on, added_on_error = parse_date(added_on) if isinstance(added_on, str) else (None, True)
+            if added_on_error:
+                row_errors['added_on'] = "This field needs to be a valid ISO 8601 date in UTC."
+            elif timezone.is_naive(added_on):
+                added_on = timezone.make_aware(added_on, timezone.utc)
+
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+        else:
+            comments.append(models.Comment(movie_id=movie_id, comment=comment, added_on=added_on))
+
+    use_copy = connection.vendor == 'postgresql'
+    for start in range(0, len(comments), settings.BULK_COMMENTS_BATCH_SIZE):
+        batch = comments[start:start + settings.BULK_COMMENTS_BATCH_SIZE]
+        if use_copy:
+            models.Comment.objects.copy_from(batch)
+        else:
+            models.Comment.objects.bulk_create(batch)
+
+    return len(comments), errors
+
+
+def export_movies(search=None, year=None, updated_since=None, using=None):
+    """
+    Yields serialized movies as NDJSON lines, read in chunks with server side cursor.
+    :param using: database alias, picked by routers when the first line is read by default.
+    """
+    queryset = models.Movie.objects.using(using)
+    if search:
+        queryset = queryset.search(search)
+    if year:
+        queryset = queryset.filter_by_year(year)
+    if updated_since:
+        queryset = queryset.filter(updated_on__gte=updated_since)
+
+    for movie in queryset.order_by('pk').iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield _to_ndjson(movie.serialize())
+
+
+def export_comments(movie_id=None, added_since=None, using=None):
+    """
+    Yields serialized comments as NDJSON lines, read in chunks with server side cursor.
+    :param using: database alias, picked by routers when the first line is read by default.
+    """
+    queryset = models.Comment.objects.using(using)
+    if movie_id:
+        queryset = queryset.filter_by_movie_id(movie_id)
+    if added_since:
+        queryset = queryset.filter(added_on__gte=added_since)
+
+    for comment in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield _to_ndjson(comment.serialize())
+
+
+def _to_ndjson(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n'
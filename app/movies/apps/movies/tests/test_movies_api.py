@@ -1,16 +1,28 @@
 import json
+from collections import Counter
 from datetime import datetime
+from io import StringIO
 
+import brotli
+import msgpack
 import pytest
 import pytz
+import requests
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from movies.apps.movies import api_views, models
-from movies.utils_tests import request_factory, freeze_now
+from movies import routers
+from movies.cache import LRUCache, movies_results
+from movies.apps.movies import api_views, models, services
+from movies.utils_tests import request_factory, freeze_now, clear_result_cache
 
 pytestmark = pytest.mark.django_db
 usefixtures = pytest.mark.usefixtures
 
-fixture_names = ['django_db_setup', 'mock_omdb_api', 'request_factory', 'freeze_now']
+fixture_names = ['django_db_setup', 'mock_omdb_api', 'request_factory', 'freeze_now', 'clear_result_cache']
 
 
 def dt(y, m, d):
@@ -265,6 +277,34 @@ def test_top_valid_range(rf):
     }
 
 
+def get_expected_trending_scores(now):
+    half_life = settings.TRENDING_HALF_LIFE
+    scores = Counter()
+    for movie_id, added_on in models.Comment.objects.values_list('movie_id', 'added_on'):
+        scores[movie_id] += 0.5 ** ((now - added_on).total_seconds() / half_life)
+    return scores
+
+
+@usefixtures(*fixture_names)
+def test_trending(rf):
+    response = api_views.TrendingView.as_view()(rf.get('/trending'))
+    assert response.status_code == 200
+    expected = get_expected_trending_scores(timezone.now())
+    assert [row['movie_id'] for row in response.data['results']] == [3, 1, 2, 4, 5]
+    assert {row['movie_id']: row['score'] for row in response.data['results']} == pytest.approx(expected, abs=1e-6)
+
+    # scores are incremented by each insert, not recomputed from comments
+    request = rf.post('/comments', data={'movie': 5, 'comment': 'Trending now.'})
+    with CaptureQueriesContext(connection) as queries:
+        api_views.CommentsView.as_view()(request)
+    assert not any('FROM "movies_comment"' in query['sql'] for query in queries.captured_queries)
+    response = api_views.TrendingView.as_view()(rf.get('/trending', data={'page_size': 2}))
+    assert response.data['results'] == [
+        {'movie_id': 5, 'score': pytest.approx(get_expected_trending_scores(timezone.now())[5], abs=1e-6)},
+        {'movie_id': 3, 'score': pytest.approx(expected[3], abs=1e-6)},
+    ]
+
+
 @usefixtures(*fixture_names)
 def test_top_missing_to(rf):
     request = rf.get('/top', data={'from': dt(2019, 10, 14).isoformat()})
@@ -304,3 +344,712 @@ def test_top_invalids(rf):
         }
     }
 
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_cursor(rf, django_assert_num_queries):
+    request = rf.get('/movies', data={'cursor': ''})
+    # write version and page, without count
+    with django_assert_num_queries(2):
+        response = api_views.MoviesView.as_view()(request)
+    response_content = response.data
+    assert response.status_code == 200
+    assert [m['id'] for m in response_content['results']] == list(range(1, 11))
+    assert response_content['next'] is not None
+
+    request = rf.get('/movies', data={'cursor': response_content['next']})
+    response = api_views.MoviesView.as_view()(request)
+    response_content = response.data
+    assert response.status_code == 200
+    assert [m['id'] for m in response_content['results']] == [11, 12]
+    assert response_content['next'] is None
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_cursor_order(rf):
+    request = rf.get('/movies', data={'order': '-Year', 'page': 2})
+    response = api_views.MoviesView.as_view()(request)
+    expected = [m['id'] for m in response.data['results']]
+
+    request = rf.get('/movies', data={'order': '-Year', 'cursor': ''})
+    response = api_views.MoviesView.as_view()(request)
+    request = rf.get('/movies', data={'order': '-Year', 'cursor': response.data['next']})
+    response = api_views.MoviesView.as_view()(request)
+    response_content = response.data
+    assert response.status_code == 200
+    assert [m['id'] for m in response_content['results']] == expected
+    assert response_content['next'] is None
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_cursor_invalid(rf):
+    request = rf.get('/movies', data={'cursor': 'invalid'})
+    response = api_views.MoviesView.as_view()(request)
+    assert response.status_code == 200
+    assert response.data == {'results': [], 'next': None}
+
+
+@usefixtures(*fixture_names)
+def test_get_comments_cursor_filter_existing_id(rf):
+    request = rf.get('/comments', data={'movie': 3, 'cursor': ''})
+    response = api_views.CommentsView.as_view()(request)
+    response_content = response.data
+    assert response.status_code == 200
+    assert [c['id'] for c in response_content['results']] == [6, 7, 8, 9, 10]
+    assert response_content['next'] is None
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_search_indexed(rf, monkeypatch):
+    monkeypatch.setattr('movies.apps.movies.models.is_postgres_extension_installed', lambda *args: True)
+
+    request = rf.get('/movies', data={'search': 'lu'})
+    response = api_views.MoviesView.as_view()(request)
+    assert response.status_code == 200
+    assert [m['id'] for m in response.data['results']] == [6, 8]
+
+    request = rf.get('/movies', data={'search': 'wars lucas'})
+    response = api_views.MoviesView.as_view()(request)
+    assert response.status_code == 200
+    assert [m['id'] for m in response.data['results']] == [6]
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_search_indexed_cursor(rf, monkeypatch):
+    monkeypatch.setattr('movies.apps.movies.models.is_postgres_extension_installed', lambda *args: True)
+
+    request = rf.get('/movies', data={'search': 'star wars'})
+    expected = [m['id'] for m in api_views.MoviesView.as_view()(request).data['results']]
+    assert len(expected) == 2
+
+    ids, cursor = [], ''
+    while cursor is not None and len(ids) <= len(expected):
+        request = rf.get('/movies', data={'search': 'star wars', 'page_size': 1, 'cursor': cursor})
+        response = api_views.MoviesView.as_view()(request)
+        assert response.status_code == 200
+        ids.extend(m['id'] for m in response.data['results'])
+        cursor = response.data['next']
+    # ties of rank are ordered by pk in the direction of the rank
+    assert sorted(ids) == sorted(expected)
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_order_year(rf):
+    request = rf.get('/movies', data={'order': '-Year'})
+    response = api_views.MoviesView.as_view()(request)
+    response_content = response.data
+    assert response.status_code == 200
+    assert [m['id'] for m in response_content['results']] == [2, 12, 11, 1, 8, 5, 10, 4, 7, 6]
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_order_ties(rf):
+    # no movie has a rating, all of them tie
+    for order, expected in [('imdbRating', list(range(1, 13))), ('-imdbRating', list(range(12, 0, -1)))]:
+        ids = []
+        for page in [1, 2, 3]:
+            request = rf.get('/movies', data={'order': order, 'page': page, 'page_size': 5})
+            ids.extend(m['id'] for m in api_views.MoviesView.as_view()(request).data['results'])
+        assert ids == expected
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_year(rf):
+    request = rf.get('/movies', data={'year': '2011'})
+    response = api_views.MoviesView.as_view()(request)
+    response_content = response.data
+    assert response.status_code == 200
+    assert response_content == {
+        'results': [
+            {'id': 2, 'Title': 'Game of Thrones', 'Director': 'N/A', 'Year': '2011-'},
+        ]
+    }
+
+
+@usefixtures(*fixture_names)
+def test_top_partial_days(rf):
+    request = rf.get(
+        '/top',
+        data={
+            'from': datetime(2019, 10, 10, 12, tzinfo=pytz.UTC).isoformat(),
+            'to': datetime(2019, 10, 12, 6, tzinfo=pytz.UTC).isoformat(),
+        }
+    )
+    response = api_views.TopView.as_view()(request)
+    response_content = response.data
+    assert response.status_code == 200
+    assert response_content == {
+        'results': [
+            {'movie_id': 3, 'rank': 1, 'total_comments': 5},
+            {'movie_id': 1, 'rank': 2, 'total_comments': 2},
+            {'movie_id': 2, 'rank': 3, 'total_comments': 1},
+            {'movie_id': 4, 'rank': 3, 'total_comments': 1},
+        ]
+    }
+
+
+@usefixtures(*fixture_names)
+def test_post_comments_updates_daily_counts(rf):
+    request = rf.post('/comments', data={'movie': 5, 'comment': 'Great movie!'})
+    api_views.CommentsView.as_view()(request)
+    daily_count = models.MovieDailyCommentCount.objects.get(movie_id=5, day=dt(2019, 10, 14).date())
+    assert daily_count.total == 1
+
+
+@usefixtures(*fixture_names)
+def test_rebuild_comment_counts():
+    expected = set(models.MovieDailyCommentCount.objects.values_list('movie_id', 'day', 'total'))
+    models.MovieDailyCommentCount.objects.all().delete()
+    call_command('rebuild_comment_counts', stdout=StringIO())
+    assert set(models.MovieDailyCommentCount.objects.values_list('movie_id', 'day', 'total')) == expected
+    assert len(expected) == 12
+
+    expected = dict(models.Movie.objects.values_list('pk', 'comment_count'))
+    models.Movie.objects.update(comment_count=0)
+    call_command('rebuild_comment_counts', stdout=StringIO())
+    assert dict(models.Movie.objects.values_list('pk', 'comment_count')) == expected
+    assert sorted(expected.values()) == [0] * 7 + [2, 2, 3, 5, 5]
+
+    expected = dict(models.Movie.objects.filter(trending_score__isnull=False).values_list('pk', 'trending_score'))
+    models.Movie.objects.update(trending_score=None)
+    call_command('rebuild_comment_counts', stdout=StringIO())
+    rebuilt = dict(models.Movie.objects.filter(trending_score__isnull=False).values_list('pk', 'trending_score'))
+    assert rebuilt == pytest.approx(expected)
+    assert len(expected) == 5
+
+
+@usefixtures(*fixture_names)
+def test_movies_batch_post(rf):
+    request = rf.post(
+        '/movies/batch',
+        data={'titles': ['Existing', 'Non-existent', 'Jumanji', 'existing']},
+        content_type='application/json'
+    )
+    response = api_views.MoviesBatchView.as_view()(request)
+    created = models.Movie.objects.all().last()
+    assert response.status_code == 200
+    assert response.data == {
+        'results': [
+            {'title': 'Existing', 'movie': {'Title': 'Existing', 'id': created.pk}},
+            {'title': 'Non-existent', 'error': 'Movie does not exist.'},
+            {'title': 'Jumanji', 'movie': {'id': 10, 'Title': 'Jumanji', 'Director': 'Joe Johnston', 'Year': '1995'}},
+            {'title': 'existing', 'movie': {'Title': 'Existing', 'id': created.pk}},
+        ]
+    }
+    assert models.Movie.objects.filter(external_data__Title='Existing').count() == 1
+
+
+@usefixtures(*fixture_names)
+def test_movies_batch_post_no_titles(rf):
+    request = rf.post('/movies/batch', data={'titles': []}, content_type='application/json')
+    response = api_views.MoviesBatchView.as_view()(request)
+    assert response.status_code == 400
+    assert response.data == {'titles': 'This field is required and must be a list of titles.'}
+
+
+@usefixtures('django_db_setup', 'request_factory')
+def test_movies_post_omdb_unavailable(rf, monkeypatch):
+    def fake_get(*args, **kwargs):
+        raise requests.ConnectTimeout('timed out')
+
+    monkeypatch.setattr(services.OMDBAPI.get_session(), 'get', fake_get)
+    request = rf.post('/movies', data={'title': 'Existing'})
+    response = api_views.MoviesView.as_view()(request)
+    assert response.status_code == 503
+    assert response.data == {'error': 'OMDb API request failed: timed out'}
+
+
+@usefixtures('django_db_setup', 'freeze_now')
+def test_cached_omdb_api(monkeypatch):
+    calls = []
+
+    def fake_get_movie(self, title):
+        calls.append(title)
+        if title == 'The Matrix':
+            return {'Title': 'The Matrix'}, None
+        elif title == 'Limited':
+            return {}, 'Request limit reached!'
+        else:
+            return {}, 'Movie not found!'
+
+    monkeypatch.setattr("movies.apps.movies.services.OMDBAPI.get_movie", fake_get_movie)
+    monkeypatch.setattr("movies.apps.movies.services.CachedOMDBAPI.stats", Counter())
+    api = services.CachedOMDBAPI()
+
+    assert api.get_movie('The Matrix') == ({'Title': 'The Matrix'}, None)
+    assert api.get_movie('the  matrix ') == ({'Title': 'The Matrix'}, None)
+    assert api.get_movies(['Missing', 'missing', 'Limited']) == [
+        ({}, 'Movie not found!'),
+        ({}, 'Movie not found!'),
+        ({}, 'Request limit reached!'),
+    ]
+    assert api.get_movie('Missing') == ({}, 'Movie not found!')
+    assert api.get_movie('Limited') == ({}, 'Request limit reached!')
+    assert calls == ['The Matrix', 'Missing', 'Limited', 'Limited']
+    assert services.CachedOMDBAPI.get_stats() == {'hits': 1, 'error_hits': 1, 'misses': 5}
+
+    models.OMDBCacheEntry.objects.filter(key='the matrix').update(expires_on=dt(2019, 10, 14))
+    api.get_movie('The Matrix')
+    assert calls[-1] == 'The Matrix'
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_not_modified(rf, django_assert_num_queries):
+    response = api_views.MoviesView.as_view()(rf.get('/movies'))
+    assert response.status_code == 200
+    etag = response['ETag']
+
+    request = rf.get('/movies', HTTP_IF_NONE_MATCH=etag)
+    with django_assert_num_queries(1):
+        response = api_views.MoviesView.as_view()(request)
+    assert response.status_code == 304
+
+    api_views.MoviesView.as_view()(rf.post('/movies', data={'title': 'Existing'}))
+    response = api_views.MoviesView.as_view()(rf.get('/movies', HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_not_modified_other_format(rf):
+    response = api_views.MoviesView.as_view()(rf.get('/movies'))
+    etag = response['ETag']
+    assert response['Vary'] == 'Accept'
+
+    request = rf.get('/movies', HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=etag)
+    response = api_views.MoviesView.as_view()(request)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+    request = rf.get('/movies', HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert api_views.MoviesView.as_view()(request).status_code == 304
+
+
+@usefixtures(*fixture_names)
+def test_get_comments_not_modified(rf):
+    movie_etag = api_views.CommentsView.as_view()(rf.get('/comments', data={'movie': 2}))['ETag']
+    other_movie_etag = api_views.CommentsView.as_view()(rf.get('/comments', data={'movie': 3}))['ETag']
+    top_request_data = {'from': dt(2019, 10, 9).isoformat(), 'to': dt(2019, 10, 20).isoformat()}
+    top_etag = api_views.TopView.as_view()(rf.get('/top', data=top_request_data))['ETag']
+
+    api_views.CommentsView.as_view()(rf.post('/comments', data={'movie': 2, 'comment': 'Great movie!'}))
+
+    response = api_views.CommentsView.as_view()(rf.get('/comments', data={'movie': 2}, HTTP_IF_NONE_MATCH=movie_etag))
+    assert response.status_code == 200
+    response = api_views.CommentsView.as_view()(
+        rf.get('/comments', data={'movie': 3}, HTTP_IF_NONE_MATCH=other_movie_etag)
+    )
+    assert response.status_code == 304
+    response = api_views.TopView.as_view()(rf.get('/top', data=top_request_data, HTTP_IF_NONE_MATCH=top_etag))
+    assert response.status_code == 200
+
+
+@usefixtures(*fixture_names)
+def test_get_comments_not_modified_non_canonical_movie_id(rf):
+    response = api_views.CommentsView.as_view()(rf.get('/comments', data={'movie': '03'}))
+    assert len(response.data['results']) == 5
+    etag = response['ETag']
+    assert etag == api_views.CommentsView.as_view()(rf.get('/comments', data={'movie': 3}))['ETag']
+
+    api_views.CommentsView.as_view()(rf.post('/comments', data={'movie': 3, 'comment': 'Great movie!'}))
+
+    response = api_views.CommentsView.as_view()(rf.get('/comments', data={'movie': '03'}, HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 200
+    assert len(response.data['results']) == 6
+
+    response = api_views.CommentsView.as_view()(rf.get('/comments', data={'movie': 'x'}, HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 400
+    assert response.data == {'errors': {'movie': 'This field needs to be a number.'}}
+    assert not response.has_header('ETag')
+
+
+@usefixtures(*fixture_names)
+def test_movies_export(rf):
+    request = rf.get('/movies/export', data={'search': 'star wars'})
+    response = api_views.MoviesExportView.as_view()(request)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/x-ndjson'
+    assert [json.loads(line) for line in b''.join(response.streaming_content).splitlines()] == [
+        {'id': 6, 'Title': 'Star Wars: Episode IV - A New Hope', 'Director': 'George Lucas', 'Year': '1977'},
+        {'id': 7, 'Title': 'Star Wars: Episode V - The Empire Strikes Back', 'Director': 'Irvin Kershner', 'Year': '1980'},
+    ]
+
+
+@usefixtures(*fixture_names)
+def test_comments_export_since(rf):
+    request = rf.get('/comments/export', data={'movie': 2, 'since': dt(2019, 10, 11).isoformat()})
+    response = api_views.CommentsExportView.as_view()(request)
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content).decode() == (
+        json.dumps({'movie_id': 2, 'comment': 'OK.', 'added_on': dt(2019, 10, 12).isoformat(), 'id': 5},
+                   separators=(',', ':')) + '\n'
+    )
+
+
+@usefixtures(*fixture_names)
+def test_export_ndjson_command():
+    output = StringIO()
+    call_command('export_ndjson', 'movies', '--year', '1999', stdout=output)
+    assert output.getvalue() == '{"Year":"1999","Title":"Fight Club","Director":"David Fincher","id":8}\n'
+
+    with pytest.raises(CommandError):
+        call_command('export_ndjson', 'comments', '--movie', 'abc', stdout=StringIO())
+
+
+@usefixtures(*fixture_names)
+def test_comments_export_invalid_movie(rf):
+    response = api_views.CommentsExportView.as_view()(rf.get('/comments/export', data={'movie': 'abc'}))
+    assert response.status_code == 400
+    assert response.data == {'errors': {'movie': 'This field needs to be a number.'}}
+
+
+@usefixtures(*fixture_names)
+def test_post_comments_bulk(rf):
+    rows = [
+        {'movie': 8, 'comment': 'First rule.', 'added_on': dt(2019, 10, 13).isoformat()},
+        {'movie': 8, 'comment': 'Second rule.'},
+        {'movie': 999, 'comment': 'Lost.'},
+        {'movie': 8, 'comment': '', 'added_on': 'yesterday'},
+        'not an object',
+        # movie 1 exists, but true isn't its id
+        {'movie': True, 'comment': 'Not an id.'},
+    ]
+    request = rf.post('/comments/bulk', data=json.dumps(rows), content_type='application/json')
+    response = api_views.CommentsBulkView.as_view()(request)
+    assert response.status_code == 200
+    assert response.data == {
+        'created': 2,
+        'errors': [
+            {'row': 2, 'errors': {'movie': 'Movie with id 999 does not exist.'}},
+            {'row': 3, 'errors': {
+                'comment': 'This field is required.',
+                'added_on': 'This field needs to be a valid ISO 8601 date in UTC.',
+            }},
+            {'row': 4, 'errors': {'non_field_errors': 'Row needs to be an object.'}},
+            {'row': 5, 'errors': {'movie': 'Movie with id True does not exist.'}},
+        ],
+    }
+    assert list(models.Comment.objects.filter(movie_id=8).values_list('comment', 'added_on')) == [
+        ('First rule.', dt(2019, 10, 13)),
+        ('Second rule.', datetime(2019, 10, 14, 7, 30, tzinfo=pytz.UTC)),
+    ]
+    assert models.MovieDailyCommentCount.objects.get(movie_id=8, day=dt(2019, 10, 13).date()).total == 1
+
+
+@usefixtures(*fixture_names)
+def test_post_comments_bulk_ndjson(rf):
+    body = '{"movie": 8, "comment": "Third rule."}\n\n{"movie": 8, "comment": "Fourth rule."}\n'
+    request = rf.post('/comments/bulk', data=body, content_type='application/x-ndjson')
+    response = api_views.CommentsBulkView.as_view()(request)
+    assert response.status_code == 200
+    assert response.data == {'created': 2, 'errors': []}
+
+    request = rf.post('/comments/bulk', data='{"movie": 8}\n{', content_type='application/x-ndjson')
+    response = api_views.CommentsBulkView.as_view()(request)
+    assert response.status_code == 400
+
+
+@usefixtures(*fixture_names)
+@pytest.mark.parametrize('view, data', [
+    (api_views.MoviesView, {}),
+    (api_views.MoviesView, {'page': 2}),
+    (api_views.MoviesView, {'page': 10}),
+    (api_views.MoviesView, {'search': 'star wars'}),
+    (api_views.MoviesView, {'order': '-Title', 'cursor': ''}),
+    (api_views.MoviesView, {'order': 'Year', 'cursor': 'WyIxOTk3Iiw1XQ=='}),
+    (api_views.MoviesView, {'fields': 'Year,Title,Missing', 'page': 2}),
+    (api_views.MoviesView, {'fields': 'Plot', 'order': '-Year', 'cursor': ''}),
+    (api_views.CommentsView, {'movie': 3}),
+    (api_views.CommentsView, {'cursor': ''}),
+    (api_views.CommentsView, lambda movie: {'movie': movie.pk}),
+    (api_views.TopView, {'from': dt(2019, 10, 9).isoformat(), 'to': dt(2019, 10, 20).isoformat()}),
+])
+def test_database_json_rendering(rf, settings, view, data):
+    movie = models.Movie.objects.filter(title_key='rendering test').first()
+    if not movie:
+        movie = models.Movie.objects.create(external_data={
+            'Title': 'Rendering \u2028 Test', 'Plot': '"Quoted"\n\t\\ \u0001 \u00fcn\u00efc\u00f6d\u00e9 \U0001f3ac', 'Year': '2000',
+            'Ratings': [{'Source': 'Internet Movie Database', 'Value': '8.5/10'}, {}], 'Genres': [],
+            'Score': 8.50, 'Votes': 1234567, 'Tiny': 1e-7, 'Huge': 1e22, 'Flags': [True, False, None], 'id': 'imdb',
+        })
+        models.Comment.objects.create(movie=movie, comment='Fun \u2029 "ok"', added_on=datetime(
+            2019, 10, 12, 10, 20, 30, 123, tzinfo=pytz.UTC
+        ))
+    if callable(data):
+        data = data(movie)
+
+    settings.DATABASE_JSON_RENDERING = False
+    response = view.as_view()(rf.get('/', data=data))
+    expected = response.render().content
+
+    settings.DATABASE_JSON_RENDERING = True
+    response = view.as_view()(rf.get('/', data=data))
+    assert response['Content-Type'] == 'application/json'
+    assert response.content == expected
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_fields(rf, django_assert_num_queries):
+    request = rf.get('/movies', data={'fields': 'Year, Title,Missing,Title', 'search': 'star wars'})
+    # write version, count and page, external data isn't loaded for each movie
+    with django_assert_num_queries(3):
+        response = api_views.MoviesView.as_view()(request)
+    assert response.status_code == 200
+    assert response.data == {
+        'results': [
+            {'Year': '1977', 'Title': 'Star Wars: Episode IV - A New Hope', 'id': 6},
+            {'Year': '1980', 'Title': 'Star Wars: Episode V - The Empire Strikes Back', 'id': 7},
+        ]
+    }
+
+
+@usefixtures(*fixture_names)
+def test_server_timing_and_metrics(client):
+    response = client.get('/movies', data={'search': 'star wars'})
+    assert response.status_code == 200
+    server_timing = response['Server-Timing'].split(', ')
+    assert [entry.split(';')[0] for entry in server_timing] == ['db', 'serialize', 'total']
+    assert server_timing[0].endswith(';desc="3 queries"')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    metrics = response.content.decode().splitlines()
+    assert 'movies_request_db_queries_bucket{method="GET",view="movies:movies",le="5.0"} 1' in metrics
+    assert 'movies_request_duration_seconds_count{method="GET",view="movies:movies"} 1' in metrics
+    misses = services.CachedOMDBAPI.get_stats().get('misses', 0)
+    assert f'movies_omdb_cache_lookups_total{{result="misses"}} {misses}' in metrics
+    assert 'movies_result_cache_lookups_total{cache="movies",result="misses"} 1' in metrics
+    assert 'movies_result_cache_hit_ratio{cache="movies"} 0.0' in metrics
+
+
+@usefixtures('django_db_setup', 'request_factory')
+def test_server_timing_omdb(client, monkeypatch):
+    class FakeSession:
+        def get(self, *args, **kwargs):
+            response = requests.Response()
+            response._content = b'{"Error": "Movie not found!"}'
+            return response
+
+    monkeypatch.setattr('movies.apps.movies.services.OMDBAPI.get_session', classmethod(lambda cls: FakeSession()))
+    response = client.post('/movies', data={'title': 'Server timing'})
+    assert response.status_code == 404
+    assert 'omdb;dur=' in response['Server-Timing']
+    assert 'desc="1 calls"' in response['Server-Timing']
+
+
+@usefixtures('django_db_setup', 'request_factory', 'clear_result_cache')
+def test_replica_routing(client, settings):
+    settings.DATABASE_REPLICAS = ['broken_replica', 'replica']
+    routers.ReplicaPool.reset()
+    movie_id = models.Movie.objects.values_list('pk', flat=True).first()
+
+    with CaptureQueriesContext(connections['replica']) as replica, CaptureQueriesContext(connection) as primary:
+        response = client.get('/movies')
+    assert response.status_code == 200
+    assert len(replica) > 1 and len(primary) == 0
+    assert not routers.ReplicaPool.is_healthy('broken_replica')
+
+    response = client.post('/comments', data={'movie': movie_id, 'comment': 'Read your writes.'})
+    assert response.status_code == 200
+    assert response.cookies[routers.PIN_COOKIE_NAME]['max-age'] == settings.REPLICA_PIN_SECONDS
+
+    # pinned client reads from the primary database, where its comment is already visible
+    with CaptureQueriesContext(connections['replica']) as replica:
+        response = client.get('/comments', data={'movie': movie_id})
+    assert len(replica) == 0
+    assert 'Read your writes.' in [comment['comment'] for comment in response.json()['results']]
+
+
+@usefixtures('django_db_setup', 'request_factory', 'clear_result_cache')
+def test_replica_routing_export(client, settings):
+    settings.DATABASE_REPLICAS = ['replica']
+    routers.ReplicaPool.reset()
+
+    for path in ['/movies/export', '/comments/export']:
+        response = client.get(path)
+        assert response.status_code == 200
+        # lines are read after the middleware returned
+        with CaptureQueriesContext(connections['replica']) as replica, CaptureQueriesContext(connection) as primary:
+            lines = b''.join(response.streaming_content).splitlines()
+        assert len(lines) > 1
+        assert len(replica) > 0 and len(primary) == 0
+
+
+@usefixtures(*fixture_names)
+def test_movies_suggest(rf, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        response = api_views.MoviesSuggestView.as_view()(rf.get('/movies/suggest', {'q': 'star wars: episode '}))
+    assert response.status_code == 200
+    assert [movie['Title'] for movie in response.data['results']] == [
+        'Star Wars: Episode IV - A New Hope',
+        'Star Wars: Episode V - The Empire Strikes Back',
+    ]
+
+    # most commented first
+    models.Comment.objects.bulk_create([models.Comment(movie_id=7, comment='Best one.', added_on=dt(2019, 10, 14))])
+    response = api_views.MoviesSuggestView.as_view()(rf.get('/movies/suggest', {'q': 'Star', 'limit': 1}))
+    assert response.data == {'results': [{'id': 7, 'Title': 'Star Wars: Episode V - The Empire Strikes Back'}]}
+
+    response = api_views.MoviesSuggestView.as_view()(rf.get('/movies/suggest', {'q': 'Sta '}))
+    assert response.data == {'results': []}
+
+    response = api_views.MoviesSuggestView.as_view()(rf.get('/movies/suggest', {'q': ' '}))
+    assert response.status_code == 400
+    assert response.data == {'q': 'This field is required.'}
+
+    response = api_views.MoviesSuggestView.as_view()(rf.get('/movies/suggest', {'q': 'Star', 'limit': 'all'}))
+    assert response.status_code == 400
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_cached(rf, settings, django_assert_num_queries):
+    response = api_views.MoviesView.as_view()(rf.get('/movies', {'search': 'Star Wars', 'page': '1'}))
+    assert response.status_code == 200
+    assert len(response.data['results']) == 2
+
+    # only write version is queried, normalized parameters share the result
+    with django_assert_num_queries(1):
+        cached = api_views.MoviesView.as_view()(rf.get('/movies', {'search': 'star wars'}))
+    assert cached.data == response.data
+
+    # found in the shared cache by other processes
+    movies_results.clear()
+    with django_assert_num_queries(1):
+        cached = api_views.MoviesView.as_view()(rf.get('/movies', {'search': 'star wars'}))
+    assert cached.data == response.data
+
+    models.Movie.objects.get_or_create_with_external_data({'Title': 'Star Wars: Episode VI - Return of the Jedi'})
+    response = api_views.MoviesView.as_view()(rf.get('/movies', {'search': 'star wars'}))
+    assert len(response.data['results']) == 3
+
+    assert movies_results.get_stats() == {'misses': 2, 'local_hits': 1, 'shared_hits': 1}
+    assert movies_results.get_hit_ratio() == 0.5
+    settings.RESULT_CACHE_ALIAS = None
+    movies_results.clear()
+    with django_assert_num_queries(3):
+        api_views.MoviesView.as_view()(rf.get('/movies', {'search': 'star wars'}))
+
+
+def test_lru_cache():
+    lru = LRUCache(2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+    assert lru.get('b') is None
+    assert (lru.get('a'), lru.get('c'), len(lru)) == (1, 3, 2)
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_page_size(rf, settings):
+    settings.MAX_PAGE_SIZE = 5
+    response = api_views.MoviesView.as_view()(rf.get('/movies', {'page_size': 3, 'page': 2}))
+    assert [movie['id'] for movie in response.data['results']] == [4, 5, 6]
+
+    response = api_views.MoviesView.as_view()(rf.get('/movies', {'page_size': 100}))
+    assert [movie['id'] for movie in response.data['results']] == [1, 2, 3, 4, 5]
+
+    response = api_views.CommentsView.as_view()(rf.get('/comments', {'page_size': 2, 'cursor': ''}))
+    assert len(response.data['results']) == 2
+    response = api_views.CommentsView.as_view()(rf.get('/comments', {'page_size': 2, 'cursor': response.data['next']}))
+    assert [comment['id'] for comment in response.data['results']] == [3, 4]
+
+    response = api_views.TopView.as_view()(rf.get('/top', {
+        'from': '2019-10-01T00:00:00', 'to': '2019-10-31T00:00:00', 'page_size': 1
+    }))
+    assert response.data == {'results': [{'movie_id': 3, 'rank': 1, 'total_comments': 5}]}
+
+    for view, path in [(api_views.MoviesView, '/movies'), (api_views.CommentsView, '/comments')]:
+        response = view.as_view()(rf.get(path, {'page_size': '0'}))
+        assert response.status_code == 400
+        assert response.data == {'errors': {'page_size': 'This field needs to be a number between 1 and 5.'}}
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_message_pack_compressed(client, settings):
+    settings.DATABASE_JSON_RENDERING = True
+    settings.COMPRESSION_MIN_SIZE = 100
+    json_response = client.get('/movies', {'page_size': 12})
+    assert json_response['Content-Type'] == 'application/json'
+    assert json_response['Vary'] == 'Accept, Accept-Encoding'
+    assert not json_response.has_header('Content-Encoding')
+
+    response = client.get(
+        '/movies', {'page_size': 12}, HTTP_ACCEPT='application/msgpack', HTTP_ACCEPT_ENCODING='gzip, br'
+    )
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/msgpack'
+    assert response['Content-Encoding'] == 'br'
+    content = brotli.decompress(response.content)
+    assert len(content) < len(json_response.content)
+    assert msgpack.unpackb(content) == json.loads(json_response.content)
+
+
+@usefixtures(*fixture_names)
+def test_movies_get_year_range(rf):
+    def get_titles(data):
+        response = api_views.MoviesView.as_view()(rf.get('/movies', {**data, 'order': 'Year'}))
+        assert response.status_code == 200
+        return [movie['Title'] for movie in response.data['results']]
+
+    # series running since 1993 match
+    assert get_titles({'year_from': '1995', 'year_to': '2000'}) == ['Matrix', 'Jumanji', 'Cube', 'Fight Club']
+    assert get_titles({'year_to': '1970'}) == ['Django', '2001: A Space Odyssey']
+    assert get_titles({'year_from': '2000', 'year_to': '1990'}) == []
+
+    models.Movie.objects.get_or_create_with_external_data({'Title': 'The Office', 'Year': '2005–2013'})
+    assert get_titles({'year_from': '2010'}) == ['Matrix', 'The Office', 'Game of Thrones']
+    assert get_titles({'year_from': '2014'}) == ['Matrix', 'Game of Thrones']
+
+    response = api_views.MoviesView.as_view()(rf.get('/movies', {'year_from': '1990s', 'year_to': '-1'}))
+    assert response.status_code == 400
+    assert response.data == {
+        'errors': {'year_from': 'This field needs to be a year.', 'year_to': 'This field needs to be a year.'}
+    }
+
+
+@usefixtures(*fixture_names)
+def test_movies_facets(rf, django_assert_num_queries):
+    request = rf.get('/movies/facets', {'facets': 'decade,Director', 'year_from': '1990', 'year_to': '1999'})
+    response = api_views.MoviesFacetsView.as_view()(request)
+    assert response.status_code == 200
+    assert response.data == {
+        'total': 4,
+        'results': {
+            'decade': [{'value': '1990s', 'count': 4}],
+            # Matrix has N/A
+            'Director': [
+                {'value': 'David Fincher', 'count': 1},
+                {'value': 'Joe Johnston', 'count': 1},
+                {'value': 'Vincenzo Natali', 'count': 1},
+            ],
+        }
+    }
+
+    models.Movie.objects.bulk_create([
+        models.Movie(external_data={'Title': 'Heat', 'Genre': 'Crime, Drama', 'Rated': 'R', 'Year': '1995'}),
+        models.Movie(external_data={'Title': 'Casino', 'Genre': 'Crime, Drama', 'Rated': 'R', 'Year': '1995'}),
+        models.Movie(external_data={'Title': 'Heat Wave', 'Genre': 'Drama', 'Rated': 'N/A', 'Year': '1990'}),
+    ])
+    response = api_views.MoviesFacetsView.as_view()(rf.get('/movies/facets', {'search': 'heat'}))
+    assert response.data == {
+        'total': 2,
+        'results': {
+            'Genre': [{'value': 'Drama', 'count': 2}, {'value': 'Crime', 'count': 1}],
+            'decade': [{'value': '1990s', 'count': 2}],
+            'Rated': [{'value': 'R', 'count': 1}],
+            'Director': [],
+        }
+    }
+
+    # only write version is queried until movies change
+    with django_assert_num_queries(1):
+        cached = api_views.MoviesFacetsView.as_view()(rf.get('/movies/facets', {'search': 'Heat'}))
+    assert cached.data == response.data
+
+    response = api_views.MoviesFacetsView.as_view()(rf.get('/movies/facets', {'facets': 'Genre,Plot'}))
+    assert response.status_code == 400
+    assert response.data == {
+        'errors': {'facets': 'Unknown facets Plot, available are Genre, decade, Rated, Director.'}
+    }
@@ -0,0 +1,171 @@
+import asyncio
+import gzip
+import json
+import re
+
+import msgpack
+import pytest
+from django.core.management import call_command
+
+from movies import metrics
+from movies.apps.movies import async_services, load_test, models
+from movies.asgi import application
+from movies.warmup import asgi_request
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def post_movie(data=None, body=None, content_type=None):
+    async def post():
+        if body is None:
+            return await asgi_request(application, 'POST', '/movies', data=data, host='testserver')
+        status, content, _ = await application_request(body, content_type)
+        return status, content
+    status, content = asyncio.run(post())
+    return status, json.loads(content)
+
+
+async def application_request(body, content_type, accept='application/json', host='testserver', headers=()):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST', 'scheme': 'http',
+        'path': '/movies', 'raw_path': b'/movies', 'query_string': b'', 'root_path': '',
+        'headers': [
+            (b'host', host.encode()),
+            (b'content-type', content_type.encode()),
+            (b'content-length', str(len(body)).encode()),
+            (b'accept', accept.encode()),
+            *headers,
+        ],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    response = {'body': b''}
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {key.decode(): value.decode() for key, value in message['headers']}
+        else:
+            response['body'] += message.get('body', b'')
+
+    await application(scope, receive, send)
+    return response['status'], response['body'], response['headers']
+
+
+@pytest.fixture
+def fake_async_omdb_api(monkeypatch):
+    calls = []
+
+    async def fake_get_movie(self, title):
+        calls.append(title)
+        await asyncio.sleep(0.1)
+        if title.lower() == 'the matrix':
+            return {'Title': 'The Matrix', 'imdbID': 'tt0133093'}, None
+        return {}, 'Movie not found!'
+
+    monkeypatch.setattr('movies.apps.movies.async_services.AsyncOMDBAPI.get_movie', fake_get_movie)
+    return calls
+
+
+def test_async_create_movie(fake_async_omdb_api):
+    async def post_concurrently():
+        requests = [
+            asgi_request(application, 'POST', '/movies', data={'title': title}, host='testserver')
+            for title in ['the matrix', 'The  Matrix', 'THE MATRIX']
+        ]
+        return await asyncio.gather(*requests)
+
+    responses = asyncio.run(post_concurrently())
+    movie = models.Movie.objects.get(imdb_id='tt0133093')
+    assert fake_async_omdb_api == ['the matrix']
+    assert [(status, json.loads(content)) for status, content in responses] == [
+        (200, {'Title': 'The Matrix', 'imdbID': 'tt0133093', 'id': movie.pk})
+    ] * 3
+
+    assert post_movie({'title': 'The Matrix'}) == (200, {'Title': 'The Matrix', 'imdbID': 'tt0133093', 'id': movie.pk})
+    assert fake_async_omdb_api == ['the matrix']
+
+
+def test_async_create_movie_errors(fake_async_omdb_api):
+    assert post_movie({'title': 'Non-existent'}) == (404, {'error': 'Movie not found!'})
+    assert post_movie({'title': 'Non-existent'}) == (404, {'error': 'Movie not found!'})
+    assert fake_async_omdb_api == ['Non-existent']
+    assert post_movie({}) == (400, {'title': 'This field is required.'})
+    assert post_movie(body=b'title=', content_type='application/x-www-form-urlencoded') == (
+        400, {'title': 'This field is required.'}
+    )
+
+
+def test_async_create_movie_middleware(monkeypatch):
+    calls = []
+
+    async def fake_get_movie(self, title):
+        calls.append(title)
+        with metrics.timed('omdb'):
+            await asyncio.sleep(0.01)
+        return {'Title': 'The Matrix', 'imdbID': 'tt0133093', 'Plot': 'A hacker learns about the Matrix. ' * 50}, None
+
+    monkeypatch.setattr('movies.apps.movies.async_services.AsyncOMDBAPI.get_movie', fake_get_movie)
+    requests_before = metrics.request_duration._totals[(('method', 'POST'), ('view', 'movies:movies'))]
+
+    request = application_request(
+        b'{"title": "The Matrix"}', 'application/json', headers=[(b'accept-encoding', b'gzip')]
+    )
+    status, content, headers = asyncio.run(request)
+    assert status == 200
+    assert json.loads(gzip.decompress(content))['imdbID'] == 'tt0133093'
+    assert headers['content-encoding'] == 'gzip'
+    assert re.fullmatch(
+        r'db;dur=[\d.]+;desc="\d+ queries", omdb;dur=[\d.]+;desc="1 calls", serialize;dur=[\d.]+, total;dur=[\d.]+',
+        headers['server-timing']
+    )
+    assert int(re.search(r'"(\d+) queries"', headers['server-timing']).group(1)) > 0
+    assert metrics.request_duration._totals[(('method', 'POST'), ('view', 'movies:movies'))] == requests_before + 1
+
+    # other hosts are rejected by django
+    request = application_request(b'{"title": "The Matrix"}', 'application/json', host='evil.example.com')
+    status, _, headers = asyncio.run(request)
+    assert status == 400
+    assert calls == ['The Matrix']
+
+
+def test_async_create_movie_unavailable(monkeypatch):
+    monkeypatch.setattr('movies.apps.movies.services.OMDBAPI.url', 'http://127.0.0.1:1/')
+    status, content = post_movie({'title': 'Unreachable'})
+    assert status == 503
+    assert content['error'].startswith('OMDb API request failed')
+    asyncio.run(async_services.AsyncOMDBAPI.close_session())
+
+
+def test_async_create_movie_other_content_is_handled_by_django(monkeypatch):
+    monkeypatch.setattr(
+        'movies.apps.movies.services.OMDBAPI.get_movie', lambda self, title: ({'Title': 'Existing'}, None)
+    )
+    body = b'--boundary\r\nContent-Disposition: form-data; name="title"\r\n\r\nExisting\r\n--boundary--\r\n'
+    status, content = post_movie(body=body, content_type='multipart/form-data; boundary=boundary')
+    assert status == 200
+    assert content['Title'] == 'Existing'
+
+
+def test_async_create_movie_message_pack_is_handled_by_django(fake_async_omdb_api, monkeypatch):
+    monkeypatch.setattr(
+        'movies.apps.movies.services.OMDBAPI.get_movie', lambda self, title: ({'Title': 'Existing'}, None)
+    )
+    request = application_request(b'{"title": "Existing"}', 'application/json', accept='application/msgpack')
+    status, content, _ = asyncio.run(request)
+    assert status == 200
+    assert msgpack.unpackb(content)['Title'] == 'Existing'
+    assert fake_async_omdb_api == []
+
+
+def test_load_test_async_command(capsys):
+    call_command(
+        'load_test_async', '--duration', '0.3', '--readers', '2', '--writers', '20', '--upstream-delay', '1',
+        '--min-ratio', '0', '--host', 'testserver'
+    )
+    output = capsys.readouterr().out
+    assert 'POST /movies: 20 requests, 20 in flight during measurement, 0 failed' in output
+    assert not models.Movie.objects.filter(title_key__startswith=load_test.TITLE_PREFIX).exists()
+
@@ -0,0 +1,54 @@
+import json
+import random
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Sum
+
+from movies.apps.movies import benchmark, models
+
+pytestmark = pytest.mark.django_db
+
+
+def test_generate_external_data_deterministic():
+    data = benchmark.generate_external_data(random.Random(1), 5)
+    assert data == benchmark.generate_external_data(random.Random(1), 5)
+    assert data['imdbID'] == 'tt00000005'
+
+
+def test_generate_synthetic_data_and_benchmark(tmp_path):
+    movies_count = models.Movie.objects.count()
+    comments_count = models.Comment.objects.count()
+    call_command('generate_synthetic_data', '--movies', '20', '--comments', '300', '--distribution', 'recent')
+    assert models.Movie.objects.count() == movies_count + 20
+    assert models.Comment.objects.count() == comments_count + 300
+    assert models.MovieDailyCommentCount.objects.aggregate(total=Sum('total'))['total'] == comments_count + 300
+
+    output = tmp_path / 'results.json'
+    call_command(
+        'benchmark', '--scenario', 'movies', '--scenario', 'comments_create', '--iterations', '3', '--warmup', '0',
+        '--output', str(output)
+    )
+    results = json.loads(output.read_text())
+    assert set(results) == {'movies', 'comments_create'}
+    assert results['movies']['queries'] == 3
+    assert models.Comment.objects.count() == comments_count + 300
+
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'movies': {'p90': 0, 'queries': 1}}))
+    with pytest.raises(CommandError, match='movies: 3 queries, baseline 1'):
+        call_command('benchmark', '--scenario', 'movies', '--iterations', '1', '--baseline', str(baseline))
+
+
+def test_encoding_benchmark(capsys):
+    call_command('generate_synthetic_data', '--movies', '20', '--comments', '0')
+    results = benchmark.run_encoding_benchmark(page_size=20, iterations=2)
+    assert list(results) == [
+        'json+identity', 'json+gzip', 'json+br', 'msgpack+identity', 'msgpack+gzip', 'msgpack+br'
+    ]
+    assert results['msgpack+identity']['bytes'] < results['json+identity']['bytes']
+    assert results['json+br']['bytes'] < results['json+identity']['bytes'] / 2
+
+    call_command('benchmark_encoding', '--page-size', '20', '--iterations', '1')
+    assert 'msgpack+br' in capsys.readouterr().out
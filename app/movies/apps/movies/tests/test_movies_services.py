@@ -0,0 +1,225 @@
+import threading
+import time
+from io import StringIO
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from movies.apps.movies import models, services
+from movies.utils import TokenBucket
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def test_get_or_create_movie_by_title_concurrent(monkeypatch):
+    calls = []
+
+    def fake_get_movie(self, title):
+        calls.append(title)
+        time.sleep(0.2)
+        return {'Title': 'The Matrix', 'imdbID': 'tt0133093'}, None
+
+    monkeypatch.setattr("movies.apps.movies.services.OMDBAPI.get_movie", fake_get_movie)
+
+    results = []
+
+    def create():
+        try:
+            results.append(services.get_or_create_movie_by_title('the matrix'))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=create) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    movie = models.Movie.objects.get(imdb_id='tt0133093')
+    assert calls == ['the matrix']
+    assert results == [({'Title': 'The Matrix', 'imdbID': 'tt0133093', 'id': movie.pk}, None)] * 5
+
+
+def test_get_or_create_movie_by_title_different_titles(monkeypatch):
+    def fake_get_movie(self, title):
+        return {'Title': 'The Matrix', 'imdbID': 'tt0133093'}, None
+
+    monkeypatch.setattr("movies.apps.movies.services.OMDBAPI.get_movie", fake_get_movie)
+
+    first, _ = services.get_or_create_movie_by_title('Matrix')
+    second, _ = services.get_or_create_movie_by_title('The Matrix')
+    batch = services.get_or_create_movies_by_titles(['Matrix 1999', 'the matrix'])
+
+    assert first == second
+    assert batch == [(first, None), (first, None)]
+    assert models.Movie.objects.filter(title_key='the matrix').count() == 1
+
+
+def test_movie_promoted_fields_out_of_range():
+    movie = models.Movie.objects.create(external_data={
+        'Title': 'Out of range', 'imdbRating': '100', 'imdbVotes': '3,000,000,000', 'Runtime': '3000000000 min',
+    })
+    movie.refresh_from_db()
+    assert (movie.imdb_rating, movie.imdb_votes, movie.runtime_minutes) == (None, None, None)
+
+    movie = models.Movie.objects.create(external_data={
+        'Title': 'In range', 'imdbRating': '10.0', 'imdbVotes': '2,147,483,647', 'Runtime': '142 min',
+    })
+    movie.refresh_from_db()
+    assert (movie.imdb_rating, movie.imdb_votes, movie.runtime_minutes) == (Decimal('10.0'), 2147483647, 142)
+
+
+def test_refresh_stale_movies(monkeypatch, settings):
+    settings.MOVIE_REFRESH_BATCH_SIZE = 2
+    responses = {
+        'tt0133093': ({'Title': 'The Matrix', 'imdbID': 'tt0133093', 'imdbRating': '8.7', 'Year': '1999'}, None),
+        'tt0000002': ({}, services.OMDBAPIUnavailable('OMDb API request failed')),
+        'tt0000003': ({}, 'Incorrect IMDb ID.'),
+    }
+    monkeypatch.setattr(
+        'movies.apps.movies.services.OMDBAPI.get_movie_by_imdb_id', lambda self, imdb_id: responses[imdb_id]
+    )
+    monkeypatch.setattr(
+        'movies.apps.movies.services.OMDBAPI.get_movie', lambda self, title: ({'Title': 'Cube', 'Year': '1997'}, None)
+    )
+
+    stale_on = timezone.now() - timedelta(days=60)
+    matrix, unavailable, not_found, cube, fresh = models.Movie.objects.bulk_create([
+        models.Movie(external_data={'Title': 'The Matrix', 'imdbID': 'tt0133093', 'imdbRating': '8.5'}),
+        models.Movie(external_data={'Title': 'Unavailable', 'imdbID': 'tt0000002'}),
+        models.Movie(external_data={'Title': 'Not Found', 'imdbID': 'tt0000003'}),
+        models.Movie(external_data={'Title': 'Cube'}),
+        models.Movie(external_data={'Title': 'Fresh', 'imdbID': 'tt0000005'}),
+    ])
+    for number, movie in enumerate([matrix, unavailable, not_found, cube]):
+        models.Movie.objects.filter(pk=movie.pk).update(fetched_on=stale_on + timedelta(seconds=number))
+    version, _ = models.WriteVersion.objects.get_version(models.Movie.WRITE_VERSION_KEY)
+
+    assert services.refresh_stale_movies(timedelta(days=30)) == (3, 1)
+
+    matrix.refresh_from_db()
+    assert matrix.external_data['imdbRating'] == '8.7'
+    assert (matrix.imdb_rating, matrix.year) == (Decimal('8.7'), 1999)
+    assert stale_on < matrix.fetched_on <= matrix.updated_on
+    assert list(models.Movie.objects.filter(year=1997).values_list('pk', flat=True)) == [cube.pk]
+    assert models.Movie.objects.get(pk=not_found.pk).external_data['Title'] == 'Not Found'
+    assert models.Movie.objects.get(pk=unavailable.pk).fetched_on == stale_on + timedelta(seconds=1)
+    assert models.WriteVersion.objects.get_version(models.Movie.WRITE_VERSION_KEY)[0] > version
+    assert models.OMDBCacheEntry.objects.get(key='the matrix').content['imdbRating'] == '8.7'
+
+    # only the movie which failed is still stale
+    assert services.refresh_stale_movies(timedelta(days=30)) == (0, 1)
+    assert models.Movie.objects.get(pk=fresh.pk).fetched_on < matrix.fetched_on
+
+
+def test_refresh_stale_movies_taken_imdb_id(monkeypatch):
+    monkeypatch.setattr(
+        'movies.apps.movies.services.OMDBAPI.get_movie',
+        lambda self, title: ({'Title': title, 'imdbID': 'tt0133093' if 'matrix' in title.lower() else 'tt0000042'}, None)
+    )
+    monkeypatch.setattr(
+        'movies.apps.movies.services.OMDBAPI.get_movie_by_imdb_id',
+        lambda self, imdb_id: ({'Title': 'The Matrix', 'imdbID': imdb_id}, None)
+    )
+    stale_on = timezone.now() - timedelta(days=60)
+    matrix, duplicate, remake, first, second = models.Movie.objects.bulk_create([
+        models.Movie(external_data={'Title': 'The Matrix', 'imdbID': 'tt0133093'}),
+        models.Movie(external_data={'Title': 'The Matrix (duplicate)'}),
+        models.Movie(external_data={'Title': 'Matrix'}),
+        # both of them resolve to the same new imdbID
+        models.Movie(external_data={'Title': 'Cube'}),
+        models.Movie(external_data={'Title': 'Cube 2'}),
+    ])
+    # duplicate left by migration 0006, its imdbID is only in external_data
+    models.Movie.objects.filter(pk=duplicate.pk).update(external_data={'Title': 'The Matrix', 'imdbID': 'tt0133093'})
+    models.Movie.objects.exclude(pk=matrix.pk).update(fetched_on=stale_on)
+
+    assert services.refresh_stale_movies(timedelta(days=30)) == (4, 0)
+    duplicate.refresh_from_db()
+    assert duplicate.imdb_id is None
+    remake.refresh_from_db()
+    assert remake.external_data == {'Title': 'Matrix'}
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.imdb_id, second.imdb_id) == ('tt0000042', None)
+    assert second.external_data == {'Title': 'Cube 2'}
+    assert min(movie.fetched_on for movie in [duplicate, remake, first, second]) > stale_on
+    assert services.refresh_stale_movies(timedelta(days=30)) == (0, 0)
+
+
+def test_refresh_movies_command(monkeypatch):
+    monkeypatch.setattr(
+        'movies.apps.movies.services.OMDBAPI.get_movie', lambda self, title: ({'Title': title, 'Year': '2001'}, None)
+    )
+    models.Movie.objects.bulk_create(models.Movie(external_data={'Title': f'Movie {number}'}) for number in range(3))
+
+    out = StringIO()
+    call_command('refresh_movies', '--older-than', '0', '--limit', '2', stdout=out)
+    assert out.getvalue() == 'Refreshed 2 movies, 0 failed.\n'
+    assert models.Movie.objects.filter(year=2001).count() == 2
+
+
+def test_refresh_movies_command_deletes_expired_cache(settings):
+    settings.OMDB_CACHE_DELETE_BATCH_SIZE = 2
+    now = timezone.now()
+    services.CachedOMDBAPI.store({f'movie {number}': ({}, 'Movie not found!') for number in range(5)})
+    models.OMDBCacheEntry.objects.exclude(key='movie 0').update(expires_on=now - timedelta(seconds=1))
+
+    out = StringIO()
+    call_command('refresh_movies', stdout=out)
+    assert out.getvalue() == 'Refreshed 0 movies, 0 failed.\nDeleted 4 expired OMDb API responses.\n'
+    assert list(models.OMDBCacheEntry.objects.values_list('key', flat=True)) == ['movie 0']
+
+
+def test_token_bucket():
+    now, sleeps = [0], []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0], sleep=sleep)
+    for _ in range(5):
+        bucket.acquire()
+    assert sleeps == [0.5, 0.5]
+
+    now[0] += 10
+    for _ in range(4):
+        bucket.acquire()
+    assert sleeps == [0.5, 0.5, 0.5]
+
+
+def test_partition_comments():
+    def partition_of(comment):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM movies_comment WHERE id = %s', [comment.pk])
+            return cursor.fetchone()[0]
+
+    now = timezone.now()
+    movie = models.Movie.objects.create(external_data={'Title': 'Cube'})
+    old, recent = models.Comment.objects.bulk_create([
+        models.Comment(movie=movie, comment='Old.', added_on=datetime(2019, 10, 10, tzinfo=timezone.utc)),
+        models.Comment(movie=movie, comment='Recent.', added_on=now),
+    ])
+
+    out = StringIO()
+    call_command('partition_comments', '--convert', '--months-ahead', '1', stdout=out)
+    assert out.getvalue().startswith('Converted comments table to monthly partitions.\nCreated 0 partitions.')
+    assert models.Comment.objects.is_partitioned()
+    assert partition_of(old) == 'movies_comment_2019_10'
+    assert partition_of(recent) == f'movies_comment_{now:%Y_%m}'
+
+    # comments of months without partition go to the default one until their partition is created
+    future = models.Comment.objects.create(movie=movie, comment='Future.', added_on=now + timedelta(days=70))
+    assert future.pk > recent.pk
+    assert partition_of(future) == 'movies_comment_default'
+    call_command('partition_comments', '--months-ahead', '3', stdout=StringIO())
+    assert partition_of(future) == f'movies_comment_{now + timedelta(days=70):%Y_%m}'
+
+    assert list(models.Comment.objects.all().filter_by_movie_id(movie.pk)) == [old, recent, future]
+    models.MovieDailyCommentCount.objects.rebuild()
+    assert models.MovieDailyCommentCount.objects.count() == 3
@@ -6,6 +6,13 @@ app_name = 'movies'
 
 urlpatterns = [
     path('comments', api_views.CommentsView.as_view(), name='comments'),
+    path('comments/bulk', api_views.CommentsBulkView.as_view(), name='comments-bulk'),
+    path('comments/export', api_views.CommentsExportView.as_view(), name='comments-export'),
     path('movies', api_views.MoviesView.as_view(), name='movies'),
+    path('movies/batch', api_views.MoviesBatchView.as_view(), name='movies-batch'),
+    path('movies/export', api_views.MoviesExportView.as_view(), name='movies-export'),
+    path('movies/suggest', api_views.MoviesSuggestView.as_view(), name='movies-suggest'),
+    path('movies/facets', api_views.MoviesFacetsView.as_view(), name='movies-facets'),
     path('top', api_views.TopView.as_view(), name='top'),
+    path('trending', api_views.TrendingView.as_view(), name='trending'),
 ]
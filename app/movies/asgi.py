@@ -0,0 +1,95 @@
+"""
+ASGI config for movies project.
+
+Movie creation waits for OMDb API without blocking a worker, other requests are passed
+to the WSGI application, which runs them in a thread pool.
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+APPLICATION_ENVIRONMENT = os.environ.get('APPLICATION_ENVIRONMENT')
+
+if APPLICATION_ENVIRONMENT == 'prod':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movies.settings.settings_prod')
+elif APPLICATION_ENVIRONMENT == 'test':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movies.settings.settings_test')
+else:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movies.settings.settings_dev')
+
+
+def close_response(wsgi_application):
+    # WsgiToAsgi doesn't close responses, django sends request_finished and closes database connections on close
+    def application(environ, start_response):
+        response = wsgi_application(environ, start_response)
+        try:
+            yield from response
+        finally:
+            response.close()
+    return application
+
+
+django_application = WsgiToAsgi(close_response(get_wsgi_application()))
+
+from movies.apps.movies import async_services, async_views  # noqa: E402 - needs configured django
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] == '/movies':
+        body = await async_views.read_body(receive)
+        parsed, title = async_views.parse_title(scope, body)
+        if parsed and async_views.is_json_accepted(scope) and async_views.is_host_allowed(scope):
+            await async_views.create_movie(scope, title, send)
+        else:
+            await django_application(scope, replay_body(body), end_with_last_body(send))
+    elif scope['type'] == 'http':
+        await django_application(scope, receive, end_with_last_body(send))
+    else:
+        await django_application(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_services.AsyncOMDBAPI.close_session()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def replay_body(body):
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    return receive
+
+
+def end_with_last_body(send):
+    """
+    WsgiToAsgi ends responses with an empty message after the body, by then clients have the whole response
+    and can send the next request over the same connection, which breaks keep-alive timeout of uvicorn.
+    Last part of the body is held back and sent together with the end of the response instead.
+    """
+    held = None
+
+    async def send_with_last_body(message):
+        nonlocal held
+        if message['type'] != 'http.response.body':
+            await send(message)
+            return
+        if held is not None:
+            if message.get('more_body', False):
+                await send(held)
+            else:
+                message = {**message, 'body': held.get('body', b'') + message.get('body', b'')}
+            held = None
+        if message.get('more_body', False):
+            held = message
+        else:
+            await send(message)
+    return send_with_last_body
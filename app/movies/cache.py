@@ -0,0 +1,108 @@
+"""
+Cache of results of frequent queries - LRU of each process in front of a Django cache shared by processes.
+Keys include write version of the data the result was computed from (see models.WriteVersion), so writes
+invalidate results by bumping the version, without looking for keys to delete. Results of old versions
+are evicted by the LRU and expire from the shared cache.
+"""
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+_missing = object()
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResultCache:
+    """
+    Results are looked up in the LRU of this process (RESULT_CACHE_MAX_ENTRIES entries) first,
+    then in the RESULT_CACHE_ALIAS cache of CACHES, if it's set, and computed only if neither has them.
+    Lookups are counted by tier which answered them, reported by /metrics.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.stats = Counter()
+        self._local = LRUCache(settings.RESULT_CACHE_MAX_ENTRIES)
+        self._stats_lock = threading.Lock()
+
+    def get_or_compute(self, key, version, compute):
+        """
+        :param key: tuple of normalized parameters of the result.
+        :param version: write version of the data, results of other versions aren't returned.
+        :param compute: function returning the result, which needs to be picklable for the shared cache.
+        """
+        # hashed, so keys are valid in any backend, such as memcached which doesn't allow spaces
+        key = f'{self.name}:{version}:{hashlib.md5(repr(key).encode()).hexdigest()}'
+        value = self._local.get(key, _missing)
+        if value is not _missing:
+            self._count('local_hits')
+            return value
+
+        shared = caches[settings.RESULT_CACHE_ALIAS] if settings.RESULT_CACHE_ALIAS else None
+        if shared is not None:
+            value = shared.get(key, _missing)
+            if value is not _missing:
+                self._count('shared_hits')
+                self._local.set(key, value)
+                return value
+
+        self._count('misses')
+        # version was read before the result, so the result is at least as new as the version it's stored under
+        value = compute()
+        self._local.set(key, value)
+        if shared is not None:
+            shared.set(key, value, settings.RESULT_CACHE_TIMEOUT)
+        return value
+
+    def clear(self):
+        """
+        Clears the LRU of this process, the shared cache isn't cleared.
+        """
+        self._local.clear()
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def get_hit_ratio(self):
+        stats = self.get_stats()
+        lookups = sum(stats.values())
+        return (stats.get('local_hits', 0) + stats.get('shared_hits', 0)) / lookups if lookups else 0.0
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+
+movies_results = ResultCache('movies')
+facets_results = ResultCache('facets')
+result_caches = [movies_results, facets_results]
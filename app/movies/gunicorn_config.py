@@ -0,0 +1,85 @@
+"""
+Gunicorn config of production server:
+    gunicorn -c movies/gunicorn_config.py movies.asgi:application
+
+Number of workers and threads is derived from CPU cores available to the container and worker class,
+GUNICORN_WORKER_CLASS, GUNICORN_WORKERS and GUNICORN_THREADS environment variables override them.
+"""
+import multiprocessing
+import os
+
+
+def get_available_cores():
+    """
+    :return: number of cores the process can use, limited by cgroup CPU quota of the container if there is one.
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else multiprocessing.cpu_count()
+    quota = _read_cgroup_quota()
+    if quota:
+        cores = min(cores, max(1, int(quota)))
+    return cores
+
+
+def _read_cgroup_quota():
+    try:
+        # cgroup v2
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f, open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as g:
+            quota, period = int(f.read()), int(g.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def get_workers(worker_class, cores):
+    """
+    :return: (int, int)  # Tuple of number of workers and threads of each of them.
+    """
+    if worker_class.startswith('uvicorn'):
+        # event loop waits for OMDb API and other requests run in its thread pool, one worker per core is enough
+        return cores, 1
+    if worker_class == 'gthread':
+        return cores, 4
+    # sync workers handle one request at a time, more of them keep cores busy while some wait for I/O
+    return 2 * cores + 1, 1
+
+
+def is_asgi(worker_class):
+    return worker_class.startswith('uvicorn')
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+_workers, _threads = get_workers(worker_class, get_available_cores())
+workers = int(os.environ.get('GUNICORN_WORKERS', _workers))
+threads = int(os.environ.get('GUNICORN_THREADS', _threads))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# django is imported once by the master, workers are forked with it loaded
+preload_app = True
+# workers silent for this many seconds are restarted, requests in progress get this many seconds on restart
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+
+def pre_fork(server, worker):
+    # connections opened while loading the app can't be shared with forked workers
+    from django.db import connections
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    # called before the worker accepts connections
+    from movies import warmup
+
+    if is_asgi(worker.cfg.worker_class_str):
+        warmup.warm_up_asgi(worker.wsgi, worker.log.warning)
+    else:
+        warmup.warm_up_wsgi(worker.wsgi, worker.log.warning)
+    worker.log.info('Worker warmed up.')
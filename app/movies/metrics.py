@@ -0,0 +1,163 @@
+"""
+Per-request timings and in-process Prometheus metrics.
+Metrics are kept by each process, so every worker exposes its own.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Total duration and number of calls of each kind of work done while handling a request, such as SQL queries.
+    """
+    def __init__(self):
+        self.durations = Counter()
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, duration):
+        with self._lock:
+            self.durations[name] += duration
+            self.counts[name] += 1
+
+
+def start_request():
+    """
+    :return: (RequestTimings, Token)  # Tuple of timings collected until end_request() is called with the token.
+    """
+    timings = RequestTimings()
+    return timings, _request_timings.set(timings)
+
+
+def end_request(token):
+    _request_timings.reset(token)
+
+
+def get_request_timings():
+    return _request_timings.get()
+
+
+@contextmanager
+def timed(name):
+    """
+    Adds duration of the block to timings of current request, if there is one.
+    """
+    timings = _request_timings.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start)
+
+
+def bind_context(function):
+    """
+    Wraps function to run in a copy of current context, so work done in other threads counts towards current request.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(function, *args, **kwargs)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        self._counts = defaultdict(lambda: [0] * len(self.buckets))
+        self._sums = Counter()
+        self._totals = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._counts[key]
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    counts[index] += 1
+            self._sums[key] += value
+            self._totals[key] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key in sorted(self._totals):
+                for bucket, count in zip(self.buckets, self._counts[key]):
+                    lines.append(f'{self.name}_bucket{format_labels(key + (("le", repr(float(bucket))),))} {count}')
+                lines.append(f'{self.name}_bucket{format_labels(key + (("le", "+Inf"),))} {self._totals[key]}')
+                lines.append(f'{self.name}_sum{format_labels(key)} {self._sums[key]!r}')
+                lines.append(f'{self.name}_count{format_labels(key)} {self._totals[key]}')
+        return lines
+
+
+def format_labels(labels):
+    """
+    :param labels: pairs of label name and value.
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels) + '}'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_counter(name, documentation, values):
+    """
+    :param values: dict of label pairs to value of counter.
+    """
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} counter']
+    for labels, value in sorted(values.items()):
+        lines.append(f'{name}{format_labels(labels)} {value}')
+    return lines
+
+
+def render_gauge(name, documentation, values):
+    """
+    :param values: dict of label pairs to value of gauge.
+    """
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+    for labels, value in sorted(values.items()):
+        lines.append(f'{name}{format_labels(labels)} {value!r}')
+    return lines
+
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+request_duration = Histogram(
+    'movies_request_duration_seconds', 'Total time of handling requests.', DURATION_BUCKETS
+)
+request_db_duration = Histogram(
+    'movies_request_db_duration_seconds', 'Time spent on SQL queries per request.', DURATION_BUCKETS
+)
+request_db_queries = Histogram(
+    'movies_request_db_queries', 'Number of SQL queries per request.', [1, 2, 5, 10, 25, 50, 100]
+)
+request_omdb_duration = Histogram(
+    'movies_request_omdb_duration_seconds', 'Time spent on OMDb API calls per request.', DURATION_BUCKETS
+)
+request_serialize_duration = Histogram(
+    'movies_request_serialize_duration_seconds', 'Time spent on rendering responses.', DURATION_BUCKETS
+)
+histograms = [
+    request_duration, request_db_duration, request_db_queries, request_omdb_duration, request_serialize_duration
+]
+
+
+def observe_request(view, method, duration, timings):
+    request_duration.observe(duration, view=view, method=method)
+    request_db_duration.observe(timings.durations['db'], view=view, method=method)
+    request_db_queries.observe(timings.counts['db'], view=view, method=method)
+    request_omdb_duration.observe(timings.durations['omdb'], view=view, method=method)
+    request_serialize_duration.observe(timings.durations['serialize'], view=view, method=method)
+
+
+def render_histograms():
+    return [line for histogram in histograms for line in histogram.render()]
@@ -0,0 +1,183 @@
+import time
+import zlib
+from contextlib import ExitStack
+
+import brotli
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.utils.cache import patch_vary_headers
+
+from movies import metrics, routers
+
+
+class ServerTimingMiddleware:
+    """
+    Measures SQL queries, OMDb API calls, rendering and total time of each request,
+    adds them to the response as Server-Timing header and to histograms of the view exposed in /metrics.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self.time_query))
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        duration = time.perf_counter() - start
+
+        response['Server-Timing'] = self.get_server_timing(timings, duration)
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        metrics.observe_request(view, request.method, duration, timings)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = metrics.get_request_timings()
+        start = time.perf_counter()
+
+        def time_render(response):
+            timings.add('serialize', time.perf_counter() - start)
+
+        if timings is not None:
+            response.add_post_render_callback(time_render)
+        return response
+
+    @staticmethod
+    def time_query(execute, sql, params, many, context):
+        with metrics.timed('db'):
+            return execute(sql, params, many, context)
+
+    @staticmethod
+    def get_server_timing(timings, duration):
+        entries = [f'db;dur={timings.durations["db"] * 1000:.2f};desc="{timings.counts["db"]} queries"']
+        if timings.counts['omdb']:
+            entries.append(f'omdb;dur={timings.durations["omdb"] * 1000:.2f};desc="{timings.counts["omdb"]} calls"')
+        if timings.counts['serialize']:
+            entries.append(f'serialize;dur={timings.durations["serialize"] * 1000:.2f}')
+        entries.append(f'total;dur={duration * 1000:.2f}')
+        return ', '.join(entries)
+
+
+class ReplicaMiddleware:
+    """
+    Reads of GET and HEAD requests go to a replica, unless the client was pinned to the primary database
+    by a recent write, so it sees its own writes despite replication lag.
+    """
+    SAFE_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        if request.method in self.SAFE_METHODS and routers.PIN_COOKIE_NAME not in request.COOKIES:
+            token = routers.use_read_database(routers.ReplicaPool.get_replica())
+        else:
+            token = routers.use_read_database(routers.PRIMARY_DATABASE)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.reset_read_database(token)
+
+        if request.method not in self.SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                routers.PIN_COOKIE_NAME, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_exception(self, request, exception):
+        read_database = routers.get_read_database()
+        if isinstance(exception, OperationalError) and read_database != routers.PRIMARY_DATABASE:
+            routers.ReplicaPool.eject(read_database)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least COMPRESSION_MIN_SIZE bytes and streamed responses, such as exports,
+    with brotli or gzip, whichever the client prefers, brotli if it accepts both equally.
+    """
+    CODINGS = ['br', 'gzip']
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = self.get_coding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(coding, response.streaming_content)
+            del response['Content-Length']
+        else:
+            content = compress(coding, response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # same as django's GZipMiddleware, compressed content isn't byte for byte the same anymore
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+    @classmethod
+    def get_coding(cls, accept_encoding):
+        """
+        :return: 'br', 'gzip' or None if client accepts neither.
+        """
+        qualities = {}
+        for part in accept_encoding.split(','):
+            coding, _, parameters = part.partition(';')
+            quality = 1.0
+            parameters = parameters.strip()
+            if parameters.startswith('q='):
+                try:
+                    quality = float(parameters[2:])
+                except ValueError:
+                    quality = 0.0
+            qualities[coding.strip().lower()] = quality
+
+        default = qualities.get('*', 0.0)
+        coding = max(cls.CODINGS, key=lambda c: qualities.get(c, default))
+        return coding if qualities.get(coding, default) > 0 else None
+
+
+def compress(coding, content):
+    if coding == 'br':
+        return brotli.compress(content, quality=settings.BROTLI_QUALITY)
+    compressor = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+def compress_sequence(coding, sequence):
+    """
+    Yields compressed content of sequence of bytes, parts are sent as soon as the compressor outputs them,
+    not after every item, so small items such as NDJSON lines are compressed together.
+    """
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+        compress_part, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress_part, finish = compressor.compress, compressor.flush
+    for item in sequence:
+        part = compress_part(item)
+        if part:
+            yield part
+    yield finish()
@@ -0,0 +1,119 @@
+"""
+Routing of reads to replicas. ReplicaMiddleware picks a replica for each GET and HEAD request,
+all other queries, including reads of requests which write, go to the primary database.
+"""
+import contextvars
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY_DATABASE = 'default'
+# set after writes, clients sending it read from the primary database for REPLICA_PIN_SECONDS
+PIN_COOKIE_NAME = 'read_primary'
+
+_read_database = contextvars.ContextVar('read_database', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas have the same data as the primary database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DATABASE
+
+
+def use_read_database(alias):
+    """
+    Routes reads of current context to database alias, until reset_read_database() is called with the token.
+    """
+    return _read_database.set(alias)
+
+
+def reset_read_database(token):
+    _read_database.reset(token)
+
+
+def get_read_database():
+    return _read_database.get()
+
+
+class ReplicaPool:
+    """
+    Picks replicas round-robin, skipping ones which failed their health check - couldn't be queried or lag behind
+    the primary database more than REPLICA_MAX_LAG seconds. Replicas are checked at most once every
+    REPLICA_HEALTH_CHECK_INTERVAL seconds in each process, so ejected replicas are used again once they recover.
+    """
+    _counter = itertools.count()
+    _checked_on = {}
+    _healthy = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_replica(cls):
+        """
+        :return: alias of healthy replica, primary database if there is none.
+        """
+        replicas = settings.DATABASE_REPLICAS
+        for _ in range(len(replicas)):
+            alias = replicas[next(cls._counter) % len(replicas)]
+            if cls.is_healthy(alias):
+                return alias
+        return PRIMARY_DATABASE
+
+    @classmethod
+    def is_healthy(cls, alias):
+        now = time.monotonic()
+        with cls._lock:
+            checked_on = cls._checked_on.get(alias)
+            if checked_on is not None and now - checked_on < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+                return cls._healthy[alias]
+            # other threads keep using the last result while this one checks
+            cls._checked_on[alias] = now
+            cls._healthy.setdefault(alias, True)
+
+        healthy = cls._check(alias)
+        with cls._lock:
+            cls._healthy[alias] = healthy
+        return healthy
+
+    @classmethod
+    def eject(cls, alias):
+        """
+        Stops using the replica until its next health check, such as after it failed a query.
+        """
+        with cls._lock:
+            cls._checked_on[alias] = time.monotonic()
+            cls._healthy[alias] = False
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._checked_on.clear()
+            cls._healthy.clear()
+
+    @staticmethod
+    def _check(alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                # replica which replayed everything it received isn't behind, even if there were no recent writes,
+                # lag is null on databases which aren't replicas
+                cursor.execute(
+                    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+                )
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            connection.close()
+            return False
+        return lag is None or lag <= settings.REPLICA_MAX_LAG
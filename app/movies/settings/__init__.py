@@ -45,6 +45,16 @@ DATABASES = {
     }
 }
 
+# aliases of read replicas in DATABASES, reads of GET and HEAD requests go to them
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['movies.routers.ReplicaRouter']
+# seconds clients read from the primary database after their write
+REPLICA_PIN_SECONDS = 10
+# replicas lagging behind more seconds than this aren't used until they catch up
+REPLICA_MAX_LAG = 10
+# seconds between health checks of each replica in a process
+REPLICA_HEALTH_CHECK_INTERVAL = 5
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -58,6 +68,9 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'movies.middleware.ServerTimingMiddleware',
+    'movies.middleware.CompressionMiddleware',
+    'movies.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -97,10 +110,88 @@ USE_TZ = True
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
+        'movies.renderers.MessagePackRenderer',
     ]
 }
 
+# responses smaller than this many bytes aren't compressed, streamed responses always are
+COMPRESSION_MIN_SIZE = 1024
+# 0-9 and 0-11, higher compress better and slower, brotli 5 compresses pages of movies better and faster than gzip 6
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # results of frequent queries shared by processes, such as memcached, local memory keeps them in each process
+    'results': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'results',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 # App specific settings
 PAGE_SIZE = 10
+# max page size clients can ask for with page_size
+MAX_PAGE_SIZE = 100
+
+# results of frequent queries, such as pages of /movies, are kept in LRU of this many entries by each process
+RESULT_CACHE_MAX_ENTRIES = 1000
+# alias of CACHES shared by processes, looked up when a result isn't in the LRU, None to use only the LRU
+RESULT_CACHE_ALIAS = 'results'
+# seconds results are kept in the shared cache, they are invalidated by writes anyway
+RESULT_CACHE_TIMEOUT = 10 * 60
 
 OMDB_API_KEY = os.environ.get('OMDB_API_KEY')
+# seconds to wait for OMDb API to connect and respond
+OMDB_API_TIMEOUT = 5
+# max number of concurrent OMDb API requests per process
+OMDB_API_CONCURRENCY = 10
+# max number of concurrent OMDb API requests of asynchronous movie creation (movies.asgi) per process
+OMDB_API_ASYNC_CONCURRENCY = 200
+# number of threads running database queries of asynchronous movie creation per process
+ASYNC_DATABASE_THREADS = 10
+# seconds to keep OMDb API responses of found movies and errors, such as "Movie not found!"
+OMDB_CACHE_TTL = 7 * 24 * 60 * 60
+OMDB_CACHE_ERROR_TTL = 60 * 60
+# number of expired OMDb API responses deleted at once by refresh_movies command
+OMDB_CACHE_DELETE_BATCH_SIZE = 1000
+
+# movies are fetched again from OMDb API by refresh_movies command once their data is older than this many seconds
+MOVIE_REFRESH_AGE = 30 * 24 * 60 * 60
+# number of movies refreshed and written at once
+MOVIE_REFRESH_BATCH_SIZE = 100
+# OMDb API requests per second and burst allowed to the refresh, half of the free plan's 1000 daily requests,
+# the rest is left for creating movies
+MOVIE_REFRESH_RATE = 500 / (24 * 60 * 60)
+MOVIE_REFRESH_BURST = 10
+
+BATCH_IMPORT_MAX_TITLES = 500
+
+# default and max number of titles returned by /movies/suggest
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+
+# external_data fields counted by /movies/facets by default and the only ones clients can ask for,
+# decade is counted from year
+FACET_FIELDS = ['Genre', 'decade', 'Rated', 'Director']
+# number of most common values of each facet
+FACET_LIMIT = 20
+
+# seconds after which a comment weighs half as much in /trending ranking,
+# rebuild_comment_counts needs to be run after changing it
+TRENDING_HALF_LIFE = 24 * 60 * 60
+
+# max number of comments in one bulk request and number of comments inserted at once
+BULK_COMMENTS_MAX_ROWS = 100000
+BULK_COMMENTS_BATCH_SIZE = 5000
+
+# render list endpoints to JSON in the database instead of serializing model instances
+DATABASE_JSON_RENDERING = True
+
+# number of rows fetched at once by NDJSON exports
+EXPORT_CHUNK_SIZE = 2000
@@ -25,3 +25,9 @@ if "DATABASE_URL" not in os.environ:
 DATABASES = {
     'default': dj_database_url.config(conn_max_age=600, ssl_require=True)
 }
+
+# comma separated urls of read replicas, optional
+DATABASE_REPLICAS = []
+for number, url in enumerate(url for url in os.environ.get('REPLICA_DATABASE_URLS', '').split(',') if url.strip()):
+    DATABASES[f'replica_{number}'] = dj_database_url.parse(url.strip(), conn_max_age=600, ssl_require=True)
+    DATABASE_REPLICAS.append(f'replica_{number}')
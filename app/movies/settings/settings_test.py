@@ -1,3 +1,10 @@
 from movies.settings import *
 
 DATABASES['default']['HOST'] = 'test_db'
+
+# tests inspect response.data, database rendering is covered by tests comparing both outputs
+DATABASE_JSON_RENDERING = False
+
+# replicas for routing tests, they read the test database, the broken one can't be connected to
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASES['broken_replica'] = {**DATABASES['default'], 'PORT': '1', 'TEST': {'MIRROR': 'default'}}
@@ -1,8 +1,17 @@
+import gzip
 import json
+from datetime import datetime
+from decimal import Decimal
 
+import brotli
+import msgpack
 import pytest
+import pytz
+from django.http import HttpResponse, StreamingHttpResponse
 
 from movies import api_views
+from movies.middleware import CompressionMiddleware
+from movies.renderers import MessagePackRenderer
 from movies.utils_tests import request_factory
 
 usefixtures = pytest.mark.usefixtures
@@ -25,3 +34,56 @@ def test_top_missing_from(rf):
         'alive': True,
         'environment_type': 'test'
     }
+
+
+@pytest.mark.parametrize('accept_encoding, coding', [
+    ('gzip, deflate, br', 'br'),
+    ('gzip', 'gzip'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('*', 'br'),
+    ('gzip;q=0, *;q=0.1', 'br'),
+    ('identity', None),
+    ('', None),
+    ('br;q=0', None),
+])
+def test_compression_coding(accept_encoding, coding):
+    assert CompressionMiddleware.get_coding(accept_encoding) == coding
+
+
+@usefixtures(*fixture_names)
+def test_compression_middleware(rf, settings):
+    settings.COMPRESSION_MIN_SIZE = 100
+    content = b'{"Title": "Matrix"}' * 10
+    middleware = CompressionMiddleware(lambda request: HttpResponse(content))
+
+    response = middleware(rf.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+    assert response['Content-Encoding'] == 'gzip'
+    assert response['Vary'] == 'Accept-Encoding'
+    assert int(response['Content-Length']) == len(response.content)
+    assert gzip.decompress(response.content) == content
+
+    response = middleware(rf.get('/', HTTP_ACCEPT_ENCODING='br'))
+    assert brotli.decompress(response.content) == content
+
+    response = middleware(rf.get('/'))
+    assert not response.has_header('Content-Encoding')
+    assert response['Vary'] == 'Accept-Encoding'
+    assert response.content == content
+
+    # not worth compressing
+    response = CompressionMiddleware(lambda request: HttpResponse(b'{}'))(rf.get('/', HTTP_ACCEPT_ENCODING='br'))
+    assert not response.has_header('Content-Encoding')
+    assert not response.has_header('Vary')
+
+    lines = [b'{"id": %d}\n' % number for number in range(1000)]
+    middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(iter(lines)))
+    response = middleware(rf.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+    parts = list(response.streaming_content)
+    assert len(parts) < len(lines)
+    assert gzip.decompress(b''.join(parts)) == b''.join(lines)
+
+
+def test_message_pack_renderer():
+    data = {'results': [{'id': 1, 'imdbRating': Decimal('8.7'), 'added_on': datetime(2019, 10, 14, tzinfo=pytz.UTC)}]}
+    content = MessagePackRenderer().render(data)
+    assert msgpack.unpackb(content) == {'results': [{'id': 1, 'imdbRating': 8.7, 'added_on': '2019-10-14T00:00:00Z'}]}
@@ -0,0 +1,33 @@
+import pytest
+from django.core.wsgi import get_wsgi_application
+
+from movies import gunicorn_config, warmup
+
+
+def test_gunicorn_workers():
+    assert gunicorn_config.get_workers('uvicorn.workers.UvicornWorker', 4) == (4, 1)
+    assert gunicorn_config.get_workers('gthread', 4) == (4, 4)
+    assert gunicorn_config.get_workers('sync', 4) == (9, 1)
+    assert gunicorn_config.get_available_cores() >= 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_warm_up_wsgi():
+    requests = warmup.get_warmup_requests()
+    assert ('/health', '') in requests
+    assert ('/movies', '') in requests
+    assert ('/movies/export', 'since=9999-01-01T00:00:00Z') in requests
+
+    logs = []
+    warmup.warm_up_wsgi(get_wsgi_application(), logs.append)
+    # only the replica of test settings which can't be connected to
+    assert [log.split(':')[0] for log in logs] == ['Warm-up could not connect to database broken_replica']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_warm_up_asgi():
+    from movies.asgi import application
+
+    logs = []
+    warmup.warm_up_asgi(application, logs.append)
+    assert [log.split(':')[0] for log in logs] == ['Warm-up could not connect to database broken_replica']
@@ -5,6 +5,7 @@ from movies.apps.movies.urls import urlpatterns as movies_urlpatterns, app_name
 
 urlpatterns = [
     path('health', api_views.HealthCheckView.as_view(), name='health'),
+    path('metrics', api_views.MetricsView.as_view(), name='metrics'),
     path('', api_views.HomeView.as_view(), name='home'),
     path('', include((movies_urlpatterns, movies_app_name), namespace='movies')),
 ]
@@ -1,11 +1,28 @@
+import base64
+import binascii
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
 import dateutil.parser
 
 from django.conf import settings
 from django.core.paginator import InvalidPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import OrderBy
 
 
-def paginate_iterable(iterable, page_number):
-    p = Paginator(iterable, settings.PAGE_SIZE)
+def paginate_iterable(iterable, page_number, page_size=None):
+    p = Paginator(iterable, page_size or settings.PAGE_SIZE)
+    if isinstance(iterable, QuerySet):
+        # annotations such as rendered JSON are only needed for the page, don't compute them for counting
+        p.count = iterable.values('pk').count()
     try:
         page = p.page(page_number)
     except InvalidPage:
@@ -14,9 +31,252 @@ def paginate_iterable(iterable, page_number):
     return page.object_list
 
 
+def paginate_by_cursor(queryset, cursor, values=None, page_size=None):
+    """
+    Keyset pagination - instead of counting rows and skipping OFFSET rows, filter on the last seen
+    (sort key, pk) pair, so every page costs the same no matter how deep it is.
+    Ordering is taken from the queryset, pk is used as a tie breaker.
+    :param queryset: queryset ordered by at most one field (besides pk).
+    :param cursor: opaque token returned as `next` by previous call, empty for first page.
+    :param values: if given, page consists of dicts of these fields instead of model instances.
+    :param page_size: number of objects on page, PAGE_SIZE by default.
+    :return: (list, None or string)  # Tuple of page objects and cursor of next page. Cursor is None on last page.
+    """
+    page_size = page_size or settings.PAGE_SIZE
+    order, key, descending, nulls_last = _get_cursor_ordering(queryset)
+    pk_lookup = 'pk__lt' if descending else 'pk__gt'
+    queryset = queryset.order_by(*([order] if key != 'pk' else []), '-pk' if descending else 'pk')
+
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return [], None
+        value, pk = position
+
+        if key == 'pk':
+            queryset = queryset.filter(**{pk_lookup: pk})
+        elif value is None:
+            query = Q(**{f'{key}__isnull': True, pk_lookup: pk})
+            if not nulls_last:
+                query |= Q(**{f'{key}__isnull': False})
+            queryset = queryset.filter(query)
+        else:
+            value_lookup = f'{key}__lt' if descending else f'{key}__gt'
+            query = Q(**{value_lookup: value}) | Q(**{key: value, pk_lookup: pk})
+            if nulls_last:
+                query |= Q(**{f'{key}__isnull': True})
+            queryset = queryset.filter(query)
+
+    if values is not None:
+        queryset = queryset.values('pk', *values, *([key] if key != 'pk' else []))
+
+    # fetch one more row than needed to find out if there is a next page, without counting
+    objects = list(queryset[:page_size + 1])
+    if len(objects) <= page_size:
+        return objects, None
+
+    objects = objects[:page_size]
+    last = objects[-1]
+    return objects, encode_cursor(_get_sort_value(last, key), _get_sort_value(last, 'pk'))
+
+
+def encode_cursor(value, pk):
+    data = json.dumps([value, pk], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    :return: (sort value, pk) tuple or None if cursor is malformed.
+    """
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        return None
+    if not isinstance(pk, int):
+        return None
+    return value, pk
+
+
+def _get_cursor_ordering(queryset):
+    """
+    :return: (order, string, bool, bool)  # Tuple of original ordering, sort key, whether it's descending
+        and whether nulls are sorted last.
+    """
+    ordering = [o for o in queryset.query.order_by if o not in ('pk', '-pk', 'id', '-id')]
+    if not ordering:
+        descending = bool(queryset.query.order_by) and queryset.query.order_by[0].startswith('-')
+        return None, 'pk', descending, True
+
+    order = ordering[0]
+    if isinstance(order, OrderBy):
+        descending = order.descending
+        # postgres puts nulls last in ascending and first in descending order by default
+        nulls_last = order.nulls_last or (not order.nulls_first and not descending)
+        return order, order.expression.name, descending, nulls_last
+
+    descending = order.startswith('-')
+    return order, order.lstrip('-'), descending, not descending
+
+
+def _get_sort_value(obj, key):
+    if isinstance(obj, dict):
+        return obj[key]
+
+    field, *path = key.split('__')
+    value = getattr(obj, field)
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def acquire_transaction_lock(name, using='default'):
+    """
+    Waits for postgres advisory lock identified by name, lock is held until the end of current transaction.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [name])
+
+
+@contextmanager
+def try_session_lock(name, using='default'):
+    """
+    Tries to take postgres advisory lock identified by name without waiting, lock is held by the connection
+    until the end of the block, not by a transaction.
+    :return: context manager yielding whether the lock was taken.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(hashtext(%s))', [name])
+        locked = cursor.fetchone()[0]
+    try:
+        yield locked
+    finally:
+        if locked:
+            with connections[using].cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(hashtext(%s))', [name])
+
+
+class TokenBucket:
+    """
+    Rate limiter shared between threads, allows `rate` operations per second on average
+    and bursts of up to `capacity` operations.
+    """
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated_on = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, waits until one is available. Waiting callers are served in order of calls.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_on) * self.rate)
+            self._updated_on = now
+            # tokens of waiting callers are taken in advance, so the next caller waits for a later one
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+
+
+_installed_extensions = {}
+
+
+def is_postgres_extension_installed(name, using='default'):
+    if (using, name) not in _installed_extensions:
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = %s)', [name])
+            _installed_extensions[(using, name)] = cursor.fetchone()[0]
+    return _installed_extensions[(using, name)]
+
+
 def parse_date(date_string):
     try:
         date = dateutil.parser.parse(date_string)
     except ValueError as e:
         return None, str(e)
     return date, None
+
+
+def normalize_title(title):
+    return ' '.join(title.casefold().split())
+
+
+def parse_omdb_year(value):
+    """
+    :return: first year of value such as "2003", "2011-" or "2011–2019", None if it can't be parsed.
+    """
+    match = re.match(r'\s*(\d{4})', value) if isinstance(value, str) else None
+    return int(match.group(1)) if match else None
+
+
+def parse_omdb_end_year(value):
+    """
+    :return: last year of value such as "2003" or "2011–2019", None if it's open-ended such as "2011-"
+        or can't be parsed.
+    """
+    if not isinstance(value, str):
+        return None
+    match = re.fullmatch(r'\s*(\d{4})\s*(?:[-–]\s*(\d{4})?\s*)?', value)
+    if not match:
+        return parse_omdb_year(value)
+    if match.group(2):
+        return int(match.group(2))
+    return None if value.strip()[-1] in '-–' else int(match.group(1))
+
+
+# largest value of integer columns
+MAX_INT = 2 ** 31 - 1
+# IMDb ratings are on 0-10 scale, their column holds at most 99.9
+MAX_RATING = Decimal(10)
+
+
+def parse_omdb_int(value):
+    """
+    :return: integer of value such as "1,234,567", None if it can't be parsed or doesn't fit integer column.
+    """
+    if not isinstance(value, str) or not re.fullmatch(r'\s*\d[\d,]*\s*', value):
+        return None
+    number = int(value.replace(',', ''))
+    return number if number <= MAX_INT else None
+
+
+def parse_omdb_decimal(value):
+    """
+    :return: Decimal of rating such as "8.5", None if it can't be parsed or isn't between 0 and MAX_RATING.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        number = Decimal(value.strip())
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() and 0 <= number <= MAX_RATING else None
+
+
+def parse_omdb_runtime(value):
+    """
+    :return: number of minutes of value such as "142 min", None if it can't be parsed or doesn't fit integer column.
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*min\s*', value) if isinstance(value, str) else None
+    return int(match.group(1)) if match and int(match.group(1)) <= MAX_INT else None
+
+
+def parse_omdb_date(value):
+    """
+    :return: date of value such as "09 Jul 2003", None if it can't be parsed.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value.strip(), '%d %b %Y').date()
+    except ValueError:
+        return None
@@ -3,8 +3,12 @@ import pytz
 
 from datetime import datetime
 
+from django.conf import settings
+from django.core.cache import caches
 from django.test import RequestFactory
 
+from movies.cache import result_caches
+
 
 @pytest.fixture(scope='module')
 def request_factory():
@@ -17,3 +21,12 @@ def freeze_now(monkeypatch):
         return datetime(year=2019, month=10, day=14, hour=7, minute=30, tzinfo=pytz.UTC)
 
     monkeypatch.setattr("django.utils.timezone.now", fake_now)
+
+
+@pytest.fixture(scope='function')
+def clear_result_cache():
+    # versions of rolled back writes repeat in following tests, results cached under them are stale
+    for cache in result_caches:
+        cache.clear()
+        cache.stats.clear()
+    caches[settings.RESULT_CACHE_ALIAS].clear()
@@ -0,0 +1,142 @@
+"""
+Warm-up of server workers before they accept traffic, used by movies.gunicorn_config, and the in-process
+ASGI request helper it shares with load tests.
+"""
+import asyncio
+import io
+import json
+import sys
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+# queries keeping requests cheap, such as exports of nothing, by name of URL pattern
+WARMUP_QUERIES = {
+    'movies:movies-export': 'since=9999-01-01T00:00:00Z',
+    'movies:comments-export': 'since=9999-01-01T00:00:00Z',
+    'movies:top': 'from=9999-01-01T00:00:00Z&to=9999-01-01T00:00:00Z',
+    'movies:movies-facets': 'year_from=9999',
+}
+
+
+def get_warmup_requests():
+    """
+    :return: list of (path, query string) tuples of URL patterns without arguments, in order of urls.py.
+    """
+    return [(f'/{route}', WARMUP_QUERIES.get(name, '')) for route, name in _iter_routes(get_resolver())]
+
+
+def _iter_routes(resolver, prefix='', namespace=''):
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            inner_namespace = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from _iter_routes(pattern, route, inner_namespace)
+        elif isinstance(pattern, URLPattern) and not pattern.pattern.converters and not pattern.pattern.regex.groups:
+            yield route, f'{namespace}{pattern.name}'
+
+
+def open_connections(log):
+    """
+    Connects to all databases from the calling thread, connections are kept for CONN_MAX_AGE.
+    """
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as e:
+            log(f'Warm-up could not connect to database {alias}: {e}')
+
+
+def warm_up_wsgi(application, log):
+    """
+    Sends GET request for each URL pattern through WSGI application, in the thread which serves requests
+    of sync workers, so their database connections stay open.
+    """
+    open_connections(log)
+    for path, query_string in get_warmup_requests():
+        statuses = []
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query_string, 'SCRIPT_NAME': '',
+            'SERVER_NAME': _get_host(), 'SERVER_PORT': '80', 'HTTP_HOST': _get_host(), 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+        }
+        response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in response:
+                pass
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+        _log_status(log, path, int(statuses[0].split()[0]))
+
+
+def warm_up_asgi(application, log):
+    """
+    Sends GET request for each URL pattern through ASGI application, on the event loop the worker runs.
+    """
+    async def warm_up():
+        for path, query_string in get_warmup_requests():
+            status, _ = await asgi_request(application, 'GET', path, query_string, host=_get_host())
+            _log_status(log, path, status)
+
+    open_connections(log)
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        # the worker runs the loop set for this thread later
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    loop.run_until_complete(warm_up())
+
+
+async def asgi_request(application, method, path, query_string='', data=None, host='localhost'):
+    """
+    Calls ASGI application in process.
+    :param data: dict sent as JSON body.
+    :return: (int, bytes)  # Tuple of response status and body.
+    """
+    body = json.dumps(data).encode() if data is not None else b''
+    headers = [(b'host', host.encode()), (b'content-length', str(len(body)).encode())]
+    if data is not None:
+        headers.append((b'content-type', b'application/json'))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': (host, 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'status': None, 'body': b''}
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] += message.get('body', b'')
+
+    await application(scope, receive, send)
+    return response['status'], response['body']
+
+
+def _get_host():
+    return next((host for host in settings.ALLOWED_HOSTS if not host.startswith('.')), 'localhost')
+
+
+def _log_status(log, path, status):
+    if status >= 500:
+        log(f'Warm-up request of {path} failed with status {status}.')